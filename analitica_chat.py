@@ -0,0 +1,175 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, deque
+
+# Términos que se cuentan por defecto en los mensajes del chat; se pueden
+# cambiar con la opción chat_terms (ver configuracion.py)
+TERMINOS = ('ahorro', 'energia', 'solar', 'panel', 'eolica', 'viento', 'consumo', 'factura')
+
+# Los conteos por ventana de tiempo se agrupan en cubetas de este tamaño
+SEGUNDOS_POR_CUBETA = 60
+
+# Tiempo que se conservan las cubetas (la ventana más larga que se puede pedir)
+RETENCION_SEGUNDOS = 24 * 60 * 60
+
+# Ventanas que se reportan en /stats por defecto, en segundos
+VENTANAS = (60, 60 * 60, 24 * 60 * 60)
+
+TOKEN = re.compile(r'\w+')
+
+
+def normalizar(texto):
+    """Minúsculas sin tildes ni diacríticos, para que 'Energía' cuente como 'energia'."""
+    texto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in texto if not unicodedata.combining(c)).casefold()
+
+
+def terminos_configurados(valor=None):
+    """Términos a partir de un texto separado por comas, o los de por defecto."""
+    if not valor:
+        return TERMINOS
+    return tuple(termino.strip() for termino in valor.split(',') if termino.strip())
+
+
+class BuscadorTerminos:
+    """Busca todos los términos del diccionario en una sola pasada (Aho–Corasick).
+
+    El autómata se construye una vez; buscar en un mensaje cuesta lo mismo
+    sin importar cuántos términos haya. Como en el conteo original, un
+    término cuenta una vez por cada palabra que lo contiene.
+    """
+
+    def __init__(self, terminos):
+        self.terminos = tuple(dict.fromkeys(normalizar(termino) for termino in terminos))
+        transiciones = [{}]
+        salidas = [frozenset()]
+        for termino in self.terminos:
+            estado = 0
+            for caracter in termino:
+                if caracter not in transiciones[estado]:
+                    transiciones.append({})
+                    salidas.append(frozenset())
+                    transiciones[estado][caracter] = len(transiciones) - 1
+                estado = transiciones[estado][caracter]
+            salidas[estado] = salidas[estado] | {termino}
+
+        # Enlaces de falla por recorrido en anchura; cada estado hereda las
+        # salidas de su enlace para no tener que seguirlos al buscar
+        fallas = [0] * len(transiciones)
+        cola = deque(transiciones[0].values())
+        while cola:
+            estado = cola.popleft()
+            for caracter, siguiente in transiciones[estado].items():
+                falla = fallas[estado]
+                while falla and caracter not in transiciones[falla]:
+                    falla = fallas[falla]
+                destino = transiciones[falla].get(caracter, 0)
+                fallas[siguiente] = destino if destino != siguiente else 0
+                salidas[siguiente] = salidas[siguiente] | salidas[fallas[siguiente]]
+                cola.append(siguiente)
+
+        self._transiciones = transiciones
+        self._fallas = fallas
+        self._salidas = salidas
+
+    def buscar(self, texto):
+        """Devuelve un Counter con las palabras del texto que contienen cada término."""
+        transiciones = self._transiciones
+        fallas = self._fallas
+        salidas = self._salidas
+        conteo = Counter()
+        for palabra in TOKEN.findall(normalizar(texto)):
+            estado = 0
+            encontrados = frozenset()
+            for caracter in palabra:
+                while estado and caracter not in transiciones[estado]:
+                    estado = fallas[estado]
+                estado = transiciones[estado].get(caracter, 0)
+                if salidas[estado]:
+                    encontrados = encontrados | salidas[estado]
+            conteo.update(encontrados)
+        return conteo
+
+
+class _Fragmento:
+    """Contadores de un solo hilo; solo ese hilo los modifica."""
+
+    def __init__(self):
+        self.mensajes = 0
+        self.total = Counter()
+        self.cubetas = {}
+
+
+class ContadoresTerminos:
+    """Conteos de términos por hilo, combinados al consultarlos.
+
+    Cada hilo escribe en su propio fragmento sin tomar ningún lock, así que
+    registrar un mensaje no agrega contención a /chat. Las consultas toman
+    una copia de cada fragmento y las suman. Los conteos son del proceso;
+    con varios workers cada uno reporta los suyos.
+    """
+
+    def __init__(self, segundos_por_cubeta=SEGUNDOS_POR_CUBETA, retencion=RETENCION_SEGUNDOS):
+        self.segundos_por_cubeta = segundos_por_cubeta
+        self.retencion = retencion
+        self.inicio = time.time()
+        self._local = threading.local()
+        self._fragmentos = []
+        self._lock = threading.Lock()
+
+    def _fragmento(self):
+        fragmento = getattr(self._local, 'fragmento', None)
+        if fragmento is None:
+            fragmento = self._local.fragmento = _Fragmento()
+            with self._lock:
+                self._fragmentos.append(fragmento)
+        return fragmento
+
+    def registrar(self, conteo, ahora=None):
+        fragmento = self._fragmento()
+        cubeta = int((time.time() if ahora is None else ahora) // self.segundos_por_cubeta)
+        fragmento.mensajes += 1
+        if not conteo:
+            return
+        fragmento.total.update(conteo)
+        actual = fragmento.cubetas.get(cubeta)
+        if actual is None:
+            # Al abrir una cubeta nueva se descartan las que salieron de la retención
+            limite = cubeta - self.retencion // self.segundos_por_cubeta
+            for vieja in [c for c in fragmento.cubetas if c <= limite]:
+                del fragmento.cubetas[vieja]
+            actual = fragmento.cubetas[cubeta] = Counter()
+        actual.update(conteo)
+
+    def combinar(self, ventana=None, ahora=None):
+        """Suma los fragmentos: el total histórico o solo los últimos `ventana` segundos."""
+        with self._lock:
+            fragmentos = list(self._fragmentos)
+        combinado = Counter()
+        if ventana is None:
+            for fragmento in fragmentos:
+                combinado.update(dict(fragmento.total))
+            return combinado
+        desde = int(((time.time() if ahora is None else ahora) - ventana) // self.segundos_por_cubeta)
+        for fragmento in fragmentos:
+            for cubeta, conteo in list(fragmento.cubetas.items()):
+                if cubeta > desde:
+                    combinado.update(dict(conteo))
+        return combinado
+
+    def mensajes(self):
+        with self._lock:
+            return sum(fragmento.mensajes for fragmento in self._fragmentos)
+
+    def estadisticas(self, top=10, ventanas=VENTANAS):
+        def mas_frecuentes(conteo):
+            return [{'termino': termino, 'conteo': n} for termino, n in conteo.most_common(top)]
+
+        return {
+            'desde': self.inicio,
+            'mensajes': self.mensajes(),
+            'top': mas_frecuentes(self.combinar()),
+            'ventanas': {str(ventana): mas_frecuentes(self.combinar(ventana)) for ventana in ventanas},
+        }
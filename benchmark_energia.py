@@ -0,0 +1,488 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import count, cycle
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Suite de benchmarks y pruebas de carga de las APIs de viento y del chat.
+#
+#   python benchmark_energia.py generate --rows 1000000
+#   python benchmark_energia.py run --rows 1000 100000 1000000 --save-baseline
+#   python benchmark_energia.py run --rows 1000 100000 --compare
+#
+# Cada tamaño de dataset se mide en un proceso aparte, para que el pico de
+# memoria (RSS) reportado sea el de ese tamaño y para que cada uno arranque
+# la aplicación desde cero.
+
+REPO_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# CSV del que se toman las estaciones (nombres, municipios y coordenadas)
+SAMPLE_CSV = os.path.join(REPO_DIRECTORY, 'Velocidades_viento_prueba.csv')
+
+# Directorio donde se guardan los CSV generados, para reutilizarlos entre corridas
+WORK_DIRECTORY = os.path.join(REPO_DIRECTORY, '.benchmarks')
+
+BASELINE_FILE = os.path.join(REPO_DIRECTORY, 'benchmark_baseline.json')
+
+DEFAULT_ROWS = (1_000, 100_000)
+DEFAULT_CONCURRENCY = (1, 16)
+DEFAULT_REQUESTS = 1_000
+WARMUP_REQUESTS = 20
+
+# Filas que se escriben en cada lote al generar un CSV
+GENERATE_CHUNK = 500_000
+
+# Rango de fechas de las observaciones generadas, en pasos de 10 minutos como las del IDEAM
+FIRST_DATE = np.datetime64('2008-01-01T00:00')
+LAST_DATE = np.datetime64('2024-01-01T00:00')
+OBSERVATION_STEP = np.timedelta64(10, 'm')
+
+# Versión del generador; cambia el nombre de los CSV guardados en WORK_DIRECTORY
+# para que no se reutilicen los generados con una versión anterior
+DATASET_VERSION = 2
+
+# Fracción de filas sin valor observado, como en los datos reales
+MISSING_VALUE_RATIO = 0.002
+
+# Tiempo máximo que se repite un microbenchmark, en segundos
+MICRO_TIME_BUDGET = 3.0
+
+# Diferencia relativa con la línea base a partir de la cual se reporta una regresión
+DEFAULT_TOLERANCE = 0.25
+
+# Respuestas de una conversación completa con el chat
+CHAT_MESSAGES = ('Ana', 'Para pagar menos en la factura de energía', None, None, '4', '5,2,3,0,4,1', '3', '40')
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso en MiB; None si no se puede medir."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo reporta en KiB y macOS en bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def latency_summary(seconds, elapsed=None):
+    """p50/p99/promedio en milisegundos y operaciones por segundo."""
+    values = np.asarray(seconds, dtype=np.float64) * 1000
+    elapsed = values.sum() / 1000 if elapsed is None else elapsed
+    return {
+        'calls': int(len(values)),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'mean_ms': float(values.mean()),
+        'throughput': len(values) / elapsed if elapsed else None,
+    }
+
+
+# --- Generador de datos ------------------------------------------------------
+
+def sample_stations(path=SAMPLE_CSV):
+    """Estaciones del CSV de muestra con una escala de velocidad por estación.
+
+    La muestra pasa por el mismo parser que la carga: se corrigen las filas
+    corridas de Bogotá y se leen los números con separadores de miles. De
+    cada estación se toma la primera fila con coordenadas válidas, con el
+    texto tal como viene en el export del IDEAM.
+    """
+    from datos_viento import CSV_COLUMNS, parse_wind_frame, repair_shifted_rows
+
+    sample = repair_shifted_rows(pd.read_csv(path, dtype=str))[list(CSV_COLUMNS)]
+    parsed = parse_wind_frame(sample)
+    codes = parsed['station_code']
+    located = (codes.notna() & parsed['latitude'].notna() & parsed['longitude'].notna()).to_numpy()
+    stations = sample[located].groupby(codes[located].to_numpy()).head(1).reset_index(drop=True)
+    speeds = parsed['observed_value'].groupby(codes).mean()
+    # Escala de Weibull (k = 2) que reproduce la velocidad media de cada estación
+    station_codes = parse_wind_frame(stations)['station_code']
+    mean_speed = speeds.reindex(station_codes).fillna(speeds.mean()).to_numpy()
+    stations['escala'] = np.maximum(mean_speed, 0.3) / 0.886
+    return stations
+
+
+def generate_wind_csv(path, rows, seed=0, stations=None):
+    """Escribe un CSV con la forma del de IDEAM y `rows` observaciones aleatorias."""
+    stations = sample_stations() if stations is None else stations
+    rng = np.random.default_rng(seed)
+    steps = int((LAST_DATE - FIRST_DATE) // OBSERVATION_STEP)
+    columns = [name for name in stations.columns if name != 'escala']
+    latitude = stations['latitud'].to_numpy(dtype=str)
+    longitude = stations['longitud'].to_numpy(dtype=str)
+
+    staging = f'{path}.tmp'
+    with open(staging, 'w', encoding='utf-8', newline='') as handle:
+        # El CSV original termina cada línea con una coma
+        handle.write(','.join(columns) + ',\n')
+        written = 0
+        while written < rows:
+            size = min(GENERATE_CHUNK, rows - written)
+            station = rng.integers(len(stations), size=size)
+            chunk = stations.iloc[station].reset_index(drop=True)
+            dates = FIRST_DATE + rng.integers(steps, size=size) * OBSERVATION_STEP
+            chunk['fechaobservacion'] = np.char.add(np.datetime_as_string(dates, unit='s'), '.000')
+            speed = np.round(rng.weibull(2.0, size) * chunk['escala'].to_numpy(), 1)
+            value = speed.astype(str)
+            value[rng.random(size) < MISSING_VALUE_RATIO] = ''
+            chunk['valorobservado'] = value
+            chunk['latitud'] = latitude[station]
+            chunk['longitud'] = longitude[station]
+            chunk[''] = ''
+            chunk[columns + ['']].to_csv(handle, header=False, index=False)
+            written += size
+    os.replace(staging, path)
+    return path
+
+
+def dataset_path(rows, seed=0, directory=WORK_DIRECTORY):
+    """CSV generado de `rows` filas; se crea la primera vez que se pide."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'viento_{rows}_{seed}_v{DATASET_VERSION}.csv')
+    if not os.path.exists(path):
+        print(f"Generando {path} ({rows} filas)...", file=sys.stderr)
+        generate_wind_csv(path, rows, seed)
+    return path
+
+
+# --- Microbenchmarks ----------------------------------------------------------
+
+def measure(function, repeat, time_budget=MICRO_TIME_BUDGET):
+    """Ejecuta `function` hasta `repeat` veces (al menos una) dentro del presupuesto de tiempo."""
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeat and (not times or time.perf_counter() - started < time_budget):
+        call_started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - call_started)
+    return latency_summary(times)
+
+
+def micro_benchmarks(data_path, snapshot_directory, seed=0):
+    from calculo_consumo import ELECTRODOMESTICOS, calcular_consumo_hogar, calcular_consumo_lote
+    from datos_viento import classify_wind_codes, load_wind_csv
+    from modelo_viento import train_naive_bayes
+    from snapshot_viento import load_snapshot, save_snapshot, snapshot_path
+
+    rng = np.random.default_rng(seed)
+    results = {}
+
+    results['load_csv'] = measure(lambda: load_wind_csv(data_path, progress=None), 3)
+    store = load_wind_csv(data_path, progress=None)
+    directory = snapshot_path(data_path, snapshot_dir=snapshot_directory)
+    save_snapshot(store, directory, source=data_path)
+    results['load_snapshot'] = measure(lambda: load_snapshot(directory), 20)
+
+    # Consultas en orden aleatorio, para no medir siempre la misma fila en caché
+    municipalities = cycle(rng.choice(np.unique(store.column('municipality')), 1000).tolist())
+    stations = cycle(rng.choice(store.station_codes(), 1000).tolist())
+    results['filter_municipality'] = measure(lambda: store.municipality_rows(next(municipalities)), 1000)
+    results['filter_station'] = measure(lambda: store.station_rows(next(stations)), 1000)
+    rows = store.all_rows()[:1000]
+    results['records_1000'] = measure(lambda: store.records(rows), 200)
+
+    results['classify_threshold'] = measure(lambda: store.municipality_summary(next(municipalities)), 1000)
+    values = store.column('observed_value')
+    values = values[~np.isnan(values)]
+    results['train_naive_bayes'] = measure(lambda: train_naive_bayes(values), 3)
+    model, _ = train_naive_bayes(values)
+    speeds = rng.uniform(0, 6, (1000, 1))
+    results['classify_model_1000'] = measure(lambda: model.predict(speeds), 200)
+    results['classify_codes_1000'] = measure(lambda: classify_wind_codes(speeds[:, 0]), 1000)
+
+    household = {
+        'personas': 4,
+        'electrodomesticos': dict(zip(ELECTRODOMESTICOS, [5, 2, 3, 0, 4, 1])),
+        'estrato': 3,
+        'panel_solar_porcentaje': 0.4,
+    }
+    results['calcular_consumo'] = measure(lambda: calcular_consumo_hogar(household), 5000)
+    households = 100_000
+    batch = (
+        rng.integers(1, 8, households),
+        rng.uniform(0, 12, (households, len(ELECTRODOMESTICOS))),
+        rng.integers(1, 8, households),
+        rng.uniform(0, 1, households),
+    )
+    results['calcular_consumo_lote_100k'] = measure(lambda: calcular_consumo_lote(*batch), 50)
+    return results
+
+
+# --- Driver de carga ASGI -----------------------------------------------------
+
+def chat_conversation(department, municipality):
+    messages = list(CHAT_MESSAGES)
+    messages[2], messages[3] = department, municipality
+    return [f'/chat/{quote(message, safe="")}' for message in messages]
+
+
+def load_scenarios(store, seed=0):
+    """Escenarios de carga: cada uno devuelve, por usuario virtual, la siguiente petición.
+
+    La caché de respuestas usa la ruta y la query como clave, así que los escenarios
+    añaden un parámetro `_` distinto en cada petición para medir el cálculo real;
+    `wind_data_cached` repite la misma URL y mide sólo el acierto en caché.
+    """
+    rng = np.random.default_rng(seed)
+    municipalities = np.unique(store.column('municipality')).tolist()
+    places = store.records(store.all_rows()[:1000], ['department', 'municipality'])
+    nonces = count()
+
+    def uncached(url):
+        return f"{url}{'&' if '?' in url else '?'}_={next(nonces)}"
+
+    def wind_data(user):
+        return 'GET', uncached(f'/wind-data?limit=100&offset={rng.integers(max(len(store) - 100, 1))}')
+
+    def wind_data_cached(user):
+        return 'GET', '/wind-data?limit=100'
+
+    def classification(user):
+        return 'GET', uncached(f'/wind-data/municipality/classification/{quote(rng.choice(municipalities))}')
+
+    def classifier(user):
+        return 'GET', uncached(f'/classifier/wind-data/municipality/classification/{quote(rng.choice(municipalities))}')
+
+    def chat(user):
+        # Cada usuario virtual recorre conversaciones completas con su propia sesión
+        if not user.get('pending'):
+            place = places[rng.integers(len(places))]
+            user['pending'] = chat_conversation(place['department'], place['municipality'])
+            user['client'].cookies.clear()
+        return 'POST', user['pending'].pop(0)
+
+    return {
+        'wind_data': wind_data,
+        'wind_data_cached': wind_data_cached,
+        'classification': classification,
+        'classifier': classifier,
+        'chat': chat,
+    }
+
+
+async def drive_load(app, next_request, concurrency, requests, warmup=WARMUP_REQUESTS):
+    """Lanza `requests` peticiones con `concurrency` usuarios virtuales contra la app ASGI."""
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    errors = 0
+
+    async def run_users(users, total, record):
+        remaining = total
+
+        async def user():
+            nonlocal remaining, errors
+            async with httpx.AsyncClient(transport=transport, base_url='http://benchmark') as client:
+                state = {'client': client}
+                while remaining > 0:
+                    remaining -= 1
+                    method, url = next_request(state)
+                    started = time.perf_counter()
+                    response = await client.request(method, url)
+                    if record:
+                        latencies.append(time.perf_counter() - started)
+                        errors += response.status_code >= 400
+
+        await asyncio.gather(*(user() for _ in range(users)))
+
+    # Calentamiento con un solo usuario, fuera de la medición
+    if warmup:
+        await run_users(1, warmup, record=False)
+    started = time.perf_counter()
+    await run_users(concurrency, requests, record=True)
+    elapsed = time.perf_counter() - started
+    return {**latency_summary(latencies, elapsed), 'errors': errors}
+
+
+def load_benchmarks(concurrency_levels, requests, seed=0):
+    # La app combinada lee WIND_DATA_PATH y WIND_SNAPSHOT_DIR del entorno
+    import main
+    from contexto_viento import get_wind_context
+
+    context = get_wind_context()
+    if 'potencial_energia_eolica' in sys.modules:
+        # Los resultados del clasificador no deben depender de un entrenamiento a medias
+        sys.modules['potencial_energia_eolica'].model_manager.wait()
+    scenarios = load_scenarios(context.store, seed)
+
+    results = {}
+    for name, next_request in scenarios.items():
+        for concurrency in concurrency_levels:
+            print(f"  {name} con {concurrency} usuarios...", file=sys.stderr)
+            results[f'{name}@{concurrency}'] = asyncio.run(
+                drive_load(main.app, next_request, concurrency, requests))
+    return results
+
+
+# --- Orquestación y líneas base ------------------------------------------------
+
+def measure_dataset(data_path, concurrency_levels, requests, seed=0):
+    """Mide un dataset en el proceso actual; se llama desde el subproceso de cada tamaño."""
+    snapshot_directory = tempfile.mkdtemp(prefix='snapshots-', dir=os.path.dirname(data_path))
+    os.environ['WIND_DATA_PATH'] = data_path
+    os.environ['WIND_SNAPSHOT_DIR'] = snapshot_directory
+    try:
+        micro = micro_benchmarks(data_path, snapshot_directory, seed)
+        return {
+            'micro': micro,
+            'load': load_benchmarks(concurrency_levels, requests, seed),
+            'peak_rss_mb': peak_rss_mb(),
+        }
+    finally:
+        shutil.rmtree(snapshot_directory, ignore_errors=True)
+
+
+def run_dataset(rows, args):
+    data_path = dataset_path(rows, args.seed)
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as output:
+        output_path = output.name
+    command = [
+        sys.executable, os.path.abspath(__file__), 'measure', data_path, output_path,
+        '--concurrency', *map(str, args.concurrency),
+        '--requests', str(args.requests),
+        '--seed', str(args.seed),
+    ]
+    print(f"Midiendo {rows} filas...", file=sys.stderr)
+    try:
+        # Lo que imprimen los módulos al cargar (avance, entrenamiento) no es parte del reporte
+        subprocess.run(command, check=True, cwd=REPO_DIRECTORY, stdout=subprocess.DEVNULL)
+        with open(output_path, encoding='utf-8') as handle:
+            return json.load(handle)
+    finally:
+        os.remove(output_path)
+
+
+def compare(results, baseline, tolerance):
+    """Lista de regresiones respecto a la línea base (tiempos, throughput y memoria)."""
+    regressions = []
+
+    def check(label, value, reference, higher_is_worse=True):
+        if value is None or not reference:
+            return
+        ratio = value / reference if higher_is_worse else reference / value if value else float('inf')
+        if ratio > 1 + tolerance:
+            regressions.append(f"{label}: {value:.3f} frente a {reference:.3f} ({ratio - 1:+.0%})")
+
+    for rows, measured in results.items():
+        reference = baseline.get(rows)
+        if reference is None:
+            continue
+        for group in ('micro', 'load'):
+            for name, values in measured[group].items():
+                previous = reference.get(group, {}).get(name)
+                if previous is None:
+                    continue
+                check(f"{rows} filas {name} p50_ms", values['p50_ms'], previous['p50_ms'])
+                if group == 'load':
+                    check(f"{rows} filas {name} p99_ms", values['p99_ms'], previous['p99_ms'])
+                    check(f"{rows} filas {name} throughput", values['throughput'], previous['throughput'], False)
+        check(f"{rows} filas peak_rss_mb", measured['peak_rss_mb'], reference.get('peak_rss_mb'))
+    return regressions
+
+
+def print_report(results):
+    for rows, measured in results.items():
+        rss = measured['peak_rss_mb']
+        print(f"\n== {rows} filas (pico RSS: {f'{rss:.0f} MiB' if rss is not None else 'n/d'}) ==")
+        print(f"{'benchmark':36} {'p50 ms':>10} {'p99 ms':>10} {'ops/s':>10} {'errores':>8}")
+        for group in ('micro', 'load'):
+            for name, values in measured[group].items():
+                print(f"{name:36} {values['p50_ms']:10.3f} {values['p99_ms']:10.3f} "
+                      f"{values['throughput'] or 0:10.1f} {values.get('errors', ''):>8}")
+
+
+def run(args):
+    results = {str(rows): run_dataset(rows, args) for rows in args.rows}
+    print_report(results)
+
+    regressions = []
+    if args.compare and not os.path.exists(args.baseline):
+        print(f"\nNo hay línea base en {args.baseline}; créala con --save-baseline para poder comparar")
+    elif args.compare:
+        with open(args.baseline, encoding='utf-8') as handle:
+            baseline = json.load(handle)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegresiones respecto a {args.baseline} (tolerancia {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+        else:
+            print(f"\nSin regresiones respecto a {args.baseline}")
+
+    if args.save_baseline:
+        baseline = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }
+        if os.path.exists(args.baseline):
+            # Se conservan los tamaños que no se midieron en esta corrida
+            with open(args.baseline, encoding='utf-8') as handle:
+                baseline['results'] = {**json.load(handle)['results'], **results}
+        with open(args.baseline, 'w', encoding='utf-8') as handle:
+            json.dump(baseline, handle, indent=2)
+        print(f"Línea base guardada en {args.baseline}")
+
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks y pruebas de carga de las APIs de energía")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="Genera un CSV sintético con la forma del del IDEAM")
+    generate.add_argument('--rows', type=int, required=True)
+    generate.add_argument('--output')
+    generate.add_argument('--seed', type=int, default=0)
+
+    benchmark = commands.add_parser('run', help="Mide uno o varios tamaños de dataset")
+    benchmark.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    benchmark.add_argument('--concurrency', type=int, nargs='+', default=DEFAULT_CONCURRENCY)
+    benchmark.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="Peticiones por escenario y nivel de concurrencia")
+    benchmark.add_argument('--seed', type=int, default=0)
+    benchmark.add_argument('--baseline', default=BASELINE_FILE)
+    benchmark.add_argument('--save-baseline', action='store_true')
+    benchmark.add_argument('--compare', action='store_true', help="Termina con código 1 si hay regresiones")
+    benchmark.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+
+    # Uso interno: mide un dataset en un proceso nuevo y escribe el resultado en JSON
+    measure_command = commands.add_parser('measure')
+    measure_command.add_argument('data_path')
+    measure_command.add_argument('output_path')
+    measure_command.add_argument('--concurrency', type=int, nargs='+', default=DEFAULT_CONCURRENCY)
+    measure_command.add_argument('--requests', type=int, default=DEFAULT_REQUESTS)
+    measure_command.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        path = args.output or dataset_path(args.rows, args.seed)
+        if args.output:
+            generate_wind_csv(path, args.rows, args.seed)
+        print(path)
+        return 0
+    if args.command == 'measure':
+        results = measure_dataset(args.data_path, args.concurrency, args.requests, args.seed)
+        with open(args.output_path, 'w', encoding='utf-8') as handle:
+            json.dump(results, handle)
+        return 0
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import gzip
+import hashlib
+import inspect
+import os
+import threading
+from collections import OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
+
+from metricas import record_cache
+from respuestas_viento import dumps
+
+# brotli es opcional: sin él las respuestas se comprimen solo con gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Etiqueta de las respuestas que dependen de todo el dataset
+ALL_DATA = ('all',)
+
+# Columnas de texto cuyas consultas por nombre pueden empezar a coincidir con
+# un valor nuevo (p. ej. un municipio que no existía)
+NAME_COLUMNS = ('municipality', 'hydrographic_zone')
+
+# Las respuestas más pequeñas que esto no se comprimen
+MIN_COMPRESS_BYTES = 1024
+
+# Fracción del tamaño de la caché que puede ocupar una sola respuesta
+MAX_ENTRY_RATIO = 1 / 16
+
+CACHE_CONTROL = 'no-cache'
+
+
+def station_tags(station_code):
+    return [('station_code', station_code)]
+
+
+def name_tags(name, codes):
+    """Etiquetas de una consulta por nombre: los valores que coinciden y los que puedan aparecer."""
+    return [(name, code) for code in codes] + [('names', name)]
+
+
+def _accepted_encoding(request):
+    accepted = {part.split(';')[0].strip().lower() for part in request.headers.get('accept-encoding', '').split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=5)
+
+
+def _matches(if_none_match, etag):
+    values = {value.strip() for value in if_none_match.split(',')}
+    return '*' in values or etag in values or etag.removeprefix('W/') in values
+
+
+class _Entry:
+    __slots__ = ('key', 'tags', 'versions', 'body', 'media_type', 'headers', 'encoded')
+
+    def __init__(self, key, tags, versions, body, media_type, headers):
+        self.key = key
+        self.tags = tags
+        self.versions = versions
+        self.body = body
+        self.media_type = media_type
+        self.headers = headers
+        # Codificación -> cuerpo comprimido, calculado la primera vez que se pide
+        self.encoded = {}
+
+    def size(self):
+        return len(self.body) + sum(map(len, self.encoded.values()))
+
+
+class ResponseCache:
+    """Respuestas de lectura ya serializadas, con ETag ligado a la versión de sus datos.
+
+    Cada respuesta se etiqueta con las estaciones, municipios o zonas de las
+    que depende (o con ALL_DATA). Las mutaciones del almacén incrementan la
+    versión de las etiquetas que tocan y descartan solo esas respuestas; el
+    resto sigue sirviéndose con el mismo ETag. Una petición con
+    If-None-Match igual al ETag actual recibe 304 sin calcular nada.
+
+    Las entradas se guardan en un LRU acotado en bytes, junto con sus
+    versiones comprimidas con gzip (o brotli, si está instalado).
+    """
+
+    def __init__(self, store, max_bytes):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = int(max_bytes * MAX_ENTRY_RATIO)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_tag = {}
+        self._versions = {}
+        self._size = 0
+        self._category_counts = {name: store.category_count(name) for name in NAME_COLUMNS}
+        # Distingue los ETag de cada arranque, porque las versiones vuelven a cero
+        self._token = os.urandom(8).hex()
+
+    def on_store_change(self, store, change):
+        """Sube la versión de lo que cambió y descarta solo esas respuestas."""
+        touched = [ALL_DATA] + [(name, code) for name, codes in change.keys.items() for code in codes]
+        for name in NAME_COLUMNS:
+            count = store.category_count(name)
+            if count != self._category_counts[name]:
+                self._category_counts[name] = count
+                touched.append(('names', name))
+        with self._lock:
+            for tag in touched:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+                for key in list(self._by_tag.get(tag, ())):
+                    self._discard(key)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= entry.size()
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def _store(self, entry):
+        with self._lock:
+            current = tuple(self._versions.get(tag, 0) for tag in entry.tags)
+            if current != entry.versions[:len(entry.tags)]:
+                # Los datos cambiaron mientras se calculaba la respuesta
+                return
+            self._discard(entry.key)
+            self._entries[entry.key] = entry
+            self._size += entry.size()
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag, set()).add(entry.key)
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            self._discard(next(iter(self._entries)))
+
+    def _encoded(self, entry, encoding):
+        body = entry.encoded.get(encoding)
+        if body is None:
+            body = _compress(entry.body, encoding)
+            with self._lock:
+                if entry.encoded.setdefault(encoding, body) is body and self._entries.get(entry.key) is entry:
+                    self._size += len(body)
+                    self._evict()
+        return body
+
+    async def respond(self, request, tags, compute, extra=()):
+        """Respuesta de la caché o de `compute()` (función, o corrutina), con ETag.
+
+        `extra` agrega a la versión otros datos de los que depende la
+        respuesta, como la versión del modelo de clasificación.
+        """
+        key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+        with self._lock:
+            versions = (*(self._versions.get(tag, 0) for tag in tags), *extra)
+            entry = self._entries.get(key)
+            if entry is not None and entry.versions == versions:
+                self._entries.move_to_end(key)
+            else:
+                entry = None
+        digest = hashlib.blake2b(repr((key, versions)).encode(), digest_size=8).hexdigest()
+        etag = f'W/"{self._token}-{digest}"'
+        headers = {'ETag': etag, 'Cache-Control': CACHE_CONTROL, 'Vary': 'Accept-Encoding'}
+
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match and _matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+        record_cache('http_response', entry is not None)
+        if entry is None:
+            result = compute()
+            if inspect.isawaitable(result):
+                result = await result
+            if isinstance(result, StreamingResponse):
+                # Las respuestas por lotes no se guardan
+                return result
+            if isinstance(result, Response):
+                if result.status_code != 200:
+                    return result
+                entry_headers = {
+                    name: value for name, value in result.headers.items()
+                    if name not in ('content-length', 'content-type')
+                }
+                entry = _Entry(key, tuple(tags), versions, bytes(result.body), result.media_type, entry_headers)
+            else:
+                entry = _Entry(key, tuple(tags), versions, dumps(jsonable_encoder(result)), 'application/json', {})
+            if len(entry.body) <= self.max_entry_bytes:
+                self._store(entry)
+
+        body = entry.body
+        encoding = _accepted_encoding(request) if len(body) >= MIN_COMPRESS_BYTES else None
+        if encoding is not None:
+            body = self._encoded(entry, encoding)
+            headers['Content-Encoding'] = encoding
+        return Response(body, media_type=entry.media_type, headers={**entry.headers, **headers})
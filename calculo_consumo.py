@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+# Constantes de consumo de energía
+ELECTRODOMESTICOS = {
+    "nevera": 1.2,  # kWh por hora
+    "lavadora": 0.5,
+    "televisor": 0.1,
+    "computador": 0.2,
+    "aire_acondicionado": 1.5,
+    "microondas": 1.2,
+}
+
+PRECIOS_KWH = {
+    1: 200,
+    2: 300,
+    3: 400,
+    4: 500,
+    5: 600,
+    6: 700,
+    7: 700,
+}
+
+# Las mismas tablas como arreglos: kWh por hora en el orden de ELECTRODOMESTICOS
+# y precio del kWh indexado directamente por estrato (la posición 0 no se usa)
+CONSUMO_POR_HORA = np.array(list(ELECTRODOMESTICOS.values()), dtype=np.float64)
+PRECIO_POR_ESTRATO = np.zeros(max(PRECIOS_KWH) + 1, dtype=np.float64)
+PRECIO_POR_ESTRATO[list(PRECIOS_KWH)] = list(PRECIOS_KWH.values())
+
+DIAS_POR_MES = 30
+MESES_POR_ANIO = 12
+
+PERIODOS = ('diario', 'mensual', 'anual')
+
+# Columnas del CSV de entrada: personas, una columna de horas por
+# electrodoméstico, estrato y porcentaje de ahorro solar (0 a 100)
+COLUMNAS_CSV = ('personas', *ELECTRODOMESTICOS, 'estrato', 'panel_solar_porcentaje')
+
+
+def validar_hogares(personas, horas, estrato, panel_solar_porcentaje):
+    """Convierte y valida los arreglos de entrada; lanza ValueError si hay valores inválidos.
+
+    `panel_solar_porcentaje` es la fracción ahorrada (0 a 1), como en el chat.
+    """
+    personas = np.asarray(personas, dtype=np.float64)
+    horas = np.asarray(horas, dtype=np.float64)
+    estrato = np.asarray(estrato)
+    panel_solar_porcentaje = np.asarray(panel_solar_porcentaje, dtype=np.float64)
+
+    if horas.ndim == 0 or horas.shape[-1] != len(ELECTRODOMESTICOS):
+        raise ValueError(f"Se esperan {len(ELECTRODOMESTICOS)} horas de uso por hogar ({', '.join(ELECTRODOMESTICOS)})")
+    if not np.issubdtype(estrato.dtype, np.integer):
+        estrato_real = estrato.astype(np.float64)
+        if np.any(estrato_real != np.round(estrato_real)):
+            raise ValueError("El estrato debe ser un número entero entre 1 y 7")
+        estrato = estrato_real.astype(np.int64)
+
+    errores = [
+        nombre for nombre, invalido in (
+            ('personas', ~(personas >= 0)),
+            ('horas', ~((horas >= 0) & (horas <= 24))),
+            ('estrato', (estrato < 1) | (estrato > 7)),
+            ('panel_solar_porcentaje', ~((panel_solar_porcentaje >= 0) & (panel_solar_porcentaje <= 1))),
+        )
+        if np.any(invalido)
+    ]
+    if errores:
+        raise ValueError(f"Valores fuera de rango en: {', '.join(errores)}")
+    return personas, horas, estrato, panel_solar_porcentaje
+
+
+def calcular_consumo_lote(personas, horas, estrato, panel_solar_porcentaje):
+    """Consumo, costos y ahorros de muchos hogares a la vez.
+
+    `horas` tiene una última dimensión con las horas de uso diario de cada
+    electrodoméstico; el resto de argumentos se combinan con las reglas de
+    broadcasting de NumPy, así que un barrido (p. ej. todos los estratos por
+    varios porcentajes) se pide con arreglos de formas compatibles.
+    Devuelve un diccionario con un arreglo por resultado, con claves de la
+    forma '<consumo|costo|ahorro|costo_con_ahorro>_<periodo>'.
+    """
+    personas, horas, estrato, panel_solar_porcentaje = validar_hogares(
+        personas, horas, estrato, panel_solar_porcentaje
+    )
+
+    consumo_diario = (horas @ CONSUMO_POR_HORA) * personas
+    costo_diario = consumo_diario * PRECIO_POR_ESTRATO[estrato]
+    ahorro_diario = costo_diario * panel_solar_porcentaje
+    factores = (1, DIAS_POR_MES, DIAS_POR_MES * MESES_POR_ANIO)
+
+    # Todas las columnas quedan con la forma combinada de las entradas
+    consumo_diario, costo_diario, ahorro_diario = np.broadcast_arrays(consumo_diario, costo_diario, ahorro_diario)
+
+    resultados = {}
+    for medida, diario in (
+        ('consumo', consumo_diario),
+        ('costo', costo_diario),
+        ('ahorro', ahorro_diario),
+        ('costo_con_ahorro', costo_diario - ahorro_diario),
+    ):
+        for periodo, factor in zip(PERIODOS, factores):
+            resultados[f'{medida}_{periodo}'] = diario * factor
+    return resultados
+
+
+def calcular_consumo_hogar(usuario_info):
+    """Resultados de un solo hogar a partir de las respuestas del chat."""
+    resultados = calcular_consumo_lote(
+        usuario_info['personas'],
+        [usuario_info['electrodomesticos'][electro] for electro in ELECTRODOMESTICOS],
+        usuario_info['estrato'],
+        usuario_info['panel_solar_porcentaje'],
+    )
+    return {nombre: float(valor) for nombre, valor in resultados.items()}
+
+
+def leer_hogares_csv(handle):
+    """Lee un CSV con las columnas de COLUMNAS_CSV y devuelve los argumentos de cálculo.
+
+    El porcentaje solar del CSV va de 0 a 100 y se convierte a fracción.
+    """
+    df = pd.read_csv(handle)
+    faltantes = [columna for columna in COLUMNAS_CSV if columna not in df.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas en el CSV: {', '.join(faltantes)}")
+    try:
+        return (
+            df['personas'].to_numpy(dtype=np.float64),
+            df[list(ELECTRODOMESTICOS)].to_numpy(dtype=np.float64),
+            df['estrato'].to_numpy(dtype=np.float64),
+            df['panel_solar_porcentaje'].to_numpy(dtype=np.float64) / 100,
+        )
+    except (TypeError, ValueError):
+        raise ValueError("El CSV debe contener solo valores numéricos")
+
+
+def resultados_csv(resultados):
+    """Serializa los resultados como CSV, una fila por hogar."""
+    df = pd.DataFrame({nombre: np.ravel(valores) for nombre, valores in resultados.items()})
+    return df.to_csv(index=False, float_format='%.2f')
@@ -1,66 +1,46 @@
-from fastapi import FastAPI, Body, HTTPException
+import tempfile
+from typing import List, Optional
+
+from fastapi import APIRouter, FastAPI, Body, Depends, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse, JSONResponse
-import pandas as pd
+from pydantic import BaseModel
 import nltk
 from nltk.tokenize import word_tokenize
 
+from contexto_viento import get_wind_context
+from cache_viento import ALL_DATA, name_tags, station_tags
+from datos_viento import BULK_CONTENT_TYPES, CODE_RANGE, InvalidWindRecord, ingest_frames, read_bulk_frames
+from ejecucion import get_work_pool
+from metricas import install_metrics, span
+from respuestas_viento import GRANULARITY_PATTERN, SeriesQuery, WindQuery, parse_series_window, series_response, wind_data_response
+from potencia_viento import DEFAULT_TURBINE, POTENTIAL_FIELDS, TURBINES, potential_records, power_curve, rank
+
 # Descarga 'punkt' para tokenización
 nltk.download('punkt')
 
-# Ruta al archivo CSV con datos de viento
-path = "D:\\Documentos 2\\Universidad_2\\Programming\\MinTIC\\Proyecto Energias Limpias\\Velocidades_viento_prueba.csv"  # Asegúrate de que el archivo CSV tenga la estructura indicada
+# Datos de viento compartidos: el CSV se configura con WIND_DATA_PATH (ver
+# configuracion.py) y se carga una sola vez por proceso, aunque otras APIs
+# montadas en la misma aplicación también los usen (ver main.py)
+wind_context = get_wind_context()
+wind_store = wind_context.store
 
-# Carga el dataset
-def load_wind_data():
-    try:
-        # Carga el dataset, omitiendo líneas problemáticas
-        df = pd.read_csv(path, on_bad_lines='skip')
-        
-        # Selección de columnas del dataset y renombramiento
-        wind_data = df[['codigoestacion', 'codigosensor', 'fechaobservacion', 'valorobservado', 
-                        'nombreestacion', 'departamento', 'municipio', 'zonahidrografica', 
-                        'latitud', 'longitud', 'descripcionsensor', 'unidadmedida']].rename(
-            columns={
-                'codigoestacion': 'station_code',
-                'codigosensor': 'sensor_code',
-                'fechaobservacion': 'observation_date',
-                'valorobservado': 'observed_value',
-                'nombreestacion': 'station_name',
-                'departamento': 'department',
-                'municipio': 'municipality',
-                'zonahidrografica': 'hydrographic_zone',
-                'latitud': 'latitude',
-                'longitud': 'longitude',
-                'descripcionSensor': 'sensor_description',
-                'unidadmedida': 'unit_measure'
-            }
-        )
-
-        # Reemplaza NaN por valores predeterminados para evitar errores de JSON
-        wind_data = wind_data.fillna({
-            'station_code': '',
-            'sensor_code': '',
-            'observation_date': '',
-            'observed_value': 0,
-            'station_name': '',
-            'department': '',
-            'municipality': '',
-            'hydrographic_zone': '',
-            'latitude': 0.0,
-            'longitude': 0.0,
-            'sensor_description': '',
-            'unit_measure': ''
-        })
-        
-        # Convierte el DataFrame a una lista de diccionarios
-        return wind_data.to_dict(orient="records")
-
-    except Exception as e:
-        print(f"Error al cargar los datos: {e}")
-        return []
-
-# Carga inicial de los datos de viento
-wind_data_list = load_wind_data()
+# Series de tiempo por estación y municipio, actualizadas con cada mutación
+wind_series = wind_context.series
+
+# Índice espacial de las estaciones, para las búsquedas por ubicación
+station_index = wind_context.station_index
+
+# Potencial eólico (densidad de potencia, Weibull, energía anual) por estación y municipio
+power_analyzer = wind_context.power_analyzer
+
+# Respuestas de lectura ya serializadas, con ETag; las mutaciones descartan
+# solo las de las estaciones, municipios o zonas que cambiaron
+response_cache = wind_context.response_cache
+
+# Las rutas async mandan aquí el trabajo pesado (páginas grandes, series,
+# rankings) para no bloquear el event loop; las consultas a índices y
+# agregados precalculados se resuelven directamente en la ruta
+work_pool = get_work_pool()
 
 # Función para clasificar la velocidad del viento
 def classify_wind_speed(value):
@@ -71,82 +51,325 @@ def classify_wind_speed(value):
     else:
         return 'Excelente'
 
+# Arma la respuesta de clasificación a partir de los agregados de un grupo
+def classification_response(summary):
+    classification_count = summary['counts']
+    # Determinar la clasificación predominante
+    predominant_classification = max(classification_count, key=classification_count.get)
+    return {
+        "classification": predominant_classification,
+        "details": classification_count,
+        "statistics": {
+            "mean": summary['mean'],
+            "min": summary['min'],
+            "max": summary['max'],
+            "samples": summary['samples']
+        }
+    }
+
+# Tamaño a partir del cual las cargas masivas se guardan en disco mientras se leen
+BULK_SPOOL_SIZE = 16 * 1024 * 1024
+
+# Las rutas se definen en un router para poder montarlas en la aplicación
+# combinada (main.py); `app` sirve esta API por separado
+router = APIRouter()
+
 # Crea una instancia de FastAPI
 app = FastAPI()
 app.title = "Análisis de Viento para Energía Eólica"
 app.version = "1.0.0"
+install_metrics(app)
 
 # Define una ruta para la API
 @app.get('/', tags=['Home'])
 def message():
     return HTMLResponse('<h1>¡Bienvenido al análisis de datos de viento para energía eólica!!!</h1>')
 
-@app.get('/wind-data', tags=['Wind Data'])
-def get_wind_data():
-    if not wind_data_list:
+# Las rutas de lectura aceptan paginación (offset/limit/cursor), proyección
+# de columnas (fields) y formato de salida (json, ndjson o csv)
+@router.get('/wind-data', tags=['Wind Data'])
+async def get_wind_data(request: Request, query: WindQuery = Depends()):
+    if not len(wind_store):
         raise HTTPException(status_code=500, detail="No wind data available.")
-    return wind_data_list
+    return await response_cache.respond(
+        request, [ALL_DATA], lambda: work_pool.run(wind_data_response, wind_store, wind_store.all_rows, query))
 
-@app.get('/wind-data/{station_code}', tags=['Wind Data'])
-def get_wind_data_by_station(station_code: int):
-    # Convierte station_code a cadena para la comparación
-    station_code_int = int(station_code)
-
-    # Filtra los datos por código de estación
-    station_data = [item for item in wind_data_list if item['station_code'] == station_code_int]
-    if not station_data:
+@router.get('/wind-data/{station_code}', tags=['Wind Data'])
+async def get_wind_data_by_station(station_code: int, request: Request, query: WindQuery = Depends()):
+    # Busca las filas de la estación en el índice por código
+    if not len(wind_store.station_rows(station_code)):
         return {"detail": "Estación no encontrada"}
-    return station_data
+    return await response_cache.respond(request, station_tags(station_code), lambda: work_pool.run(
+        wind_data_response, wind_store, lambda: wind_store.station_rows(station_code), query))
 
-@app.get('/wind-data/municipality/{municipality}', tags=['Wind Data'])
-def get_wind_data_by_municipality(municipality: str):
+@router.get('/wind-data/municipality/{municipality}', tags=['Wind Data'])
+async def get_wind_data_by_municipality(municipality: str, request: Request, query: WindQuery = Depends()):
     # Filtra los datos por municipio
-    filtered_data = [item for item in wind_data_list if municipality.lower() in item['municipality'].lower()]
-    return filtered_data
+    return await response_cache.respond(
+        request, name_tags('municipality', wind_store.municipality_codes(municipality)),
+        lambda: work_pool.run(wind_data_response, wind_store, lambda: wind_store.municipality_rows(municipality), query))
 
-@app.get('/wind-data/hydrographic-zone/{zone}', tags=['Wind Data'])
-def get_wind_data_by_zone(zone: str):
+@router.get('/wind-data/hydrographic-zone/{zone}', tags=['Wind Data'])
+async def get_wind_data_by_zone(zone: str, request: Request, query: WindQuery = Depends()):
     # Filtra los datos por zona hidrológica
-    filtered_data = [item for item in wind_data_list if zone.lower() in item['hydrographic_zone'].lower()]
-    return filtered_data
+    return await response_cache.respond(
+        request, name_tags('hydrographic_zone', wind_store.zone_codes(zone)),
+        lambda: work_pool.run(wind_data_response, wind_store, lambda: wind_store.zone_rows(zone), query))
 
 
-@app.get('/wind-data/municipality/classification/{municipality}', tags=['Wind Data'])
-def classify_wind_by_municipality(municipality: str):
+@router.get('/wind-data/municipality/classification/{municipality}', tags=['Wind Data'])
+async def classify_wind_by_municipality(municipality: str, request: Request):
     """
     Clasifica la velocidad del viento para un municipio específico.
     Devuelve 'Mala', 'Buena' o 'Excelente' en función de los datos disponibles.
     """
-    # Filtrar los datos para el municipio solicitado
-    municipality_data = [item for item in wind_data_list if municipality.lower() in item['municipality'].lower()]
+    return await response_cache.respond(
+        request, name_tags('municipality', wind_store.municipality_codes(municipality)),
+        lambda: municipality_classification(municipality))
+
+def municipality_classification(municipality):
+    # Agregados precalculados de los municipios que coinciden con la búsqueda
+    with span('wind_classification'):
+        summary = wind_store.municipality_summary(municipality)
     
-    if not municipality_data:
+    if summary is None:
         raise HTTPException(status_code=404, detail=f"No se encontraron datos para el municipio: {municipality}")
     
-    # Calcular la clasificación general basada en las velocidades observadas
-    classification_count = {
-        'Mala': 0,
-        'Buena': 0,
-        'Excelente': 0
-    }
-    
-    for item in municipality_data:
-        wind_speed = item['observed_value']
-        classification = classify_wind_speed(wind_speed)
-        classification_count[classification] += 1
-    
-    # Determinar la clasificación predominante
-    predominant_classification = max(classification_count, key=classification_count.get)
-    
     return {
         "municipality": municipality,
-        "classification": predominant_classification,
-        "details": classification_count
+        **classification_response(summary)
     }
 
 
-@app.post('/wind-data', tags=['Wind Data'])
-def create_wind_data(station_code: str, sensor_code: str = Body(), observation_date: str = Body(), observed_value: float = Body(), station_name: str = Body(), department: str = Body(), municipality: str = Body(), hydrographic_zone: str = Body(), latitude: float = Body(), longitude: float = Body(), sensor_description: str = Body(), unit_measure: str = Body()):
+@router.get('/wind-data/station/classification/{station_code}', tags=['Wind Data'])
+async def classify_wind_by_station(station_code: int, request: Request):
+    """
+    Clasifica la velocidad del viento para una estación específica.
+    """
+    return await response_cache.respond(
+        request, station_tags(station_code), lambda: station_classification(station_code))
+
+def station_classification(station_code):
+    with span('wind_classification'):
+        summary = wind_store.station_summary(station_code)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"No se encontraron datos para la estación: {station_code}")
+    return {
+        "station_code": station_code,
+        **classification_response(summary)
+    }
+
+
+@router.get('/wind-data/hydrographic-zone/classification/{zone}', tags=['Wind Data'])
+async def classify_wind_by_zone(zone: str, request: Request):
+    """
+    Clasifica la velocidad del viento para una zona hidrográfica.
+    """
+    return await response_cache.respond(
+        request, name_tags('hydrographic_zone', wind_store.zone_codes(zone)), lambda: zone_classification(zone))
+
+def zone_classification(zone):
+    with span('wind_classification'):
+        summary = wind_store.zone_summary(zone)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"No se encontraron datos para la zona: {zone}")
+    return {
+        "hydrographic_zone": zone,
+        **classification_response(summary)
+    }
+
+
+# Series de tiempo. Se declaran después de las rutas por municipio y zona
+# para que /wind-data/municipality/... no se tome como un código de estación.
+# Las fechas van en formato ISO; `end` no se incluye (start=2019&end=2020
+# es todo 2019).
+
+def station_layout(station_code):
+    if not len(wind_store.station_rows(station_code)):
+        raise HTTPException(status_code=404, detail=f"No se encontraron datos para la estación: {station_code}")
+    return wind_series.station_layout(station_code)
+
+def municipality_layout(municipality):
+    if not wind_store.municipality_codes(municipality, exact=True):
+        raise HTTPException(status_code=404, detail=f"No se encontraron datos para el municipio: {municipality}")
+    return wind_series.municipality_layout(municipality)
+
+def resampled_series(layout, series, granularity, **extra):
+    times, values = wind_series.resample(
+        layout, series.start, series.end, None if granularity == 'raw' else granularity, series.agg, series.max_points)
+    return series_response(times, values, granularity=granularity, agg=series.agg, **extra)
+
+def rolling_series(layout, series, window, **extra):
+    times, values = wind_series.rolling(
+        layout, parse_series_window(window), series.start, series.end, series.agg, series.max_points)
+    return series_response(times, values, window=window, agg=series.agg, **extra)
+
+def exceedance_series(layout, series, threshold, granularity, base, **extra):
+    times, percent, samples = wind_series.exceedance(
+        layout, threshold, series.start, series.end, granularity, None if base == 'raw' else base)
+    return series_response(
+        times, percent, threshold=threshold, granularity=granularity, base=base, samples=samples.tolist(), **extra)
+
+# Las series se calculan en el pool; las peticiones idénticas sobre los
+# mismos datos (misma versión del almacén) comparten el cálculo
+def series_key(*parts, series):
+    return (*parts, wind_store.version, series.start, series.end, series.agg, series.max_points)
+
+@router.get('/wind-data/{station_code}/series', tags=['Wind Series'])
+async def get_station_series(station_code: int, request: Request, series: SeriesQuery = Depends(), granularity: str = Query('hour', pattern=GRANULARITY_PATTERN)):
+    """
+    Serie de la estación agregada por hora, día, mes o año (granularity=raw
+    devuelve las observaciones, opcionalmente reducidas con max_points).
+    """
+    return await response_cache.respond(request, station_tags(station_code), lambda: work_pool.run(
+        lambda: resampled_series(station_layout(station_code), series, granularity, station_code=station_code),
+        key=series_key('station', station_code, granularity, series=series)))
+
+@router.get('/wind-data/{station_code}/series/rolling', tags=['Wind Series'])
+async def get_station_rolling_series(station_code: int, request: Request, series: SeriesQuery = Depends(), window: str = Query('24h', description="p. ej. 30min, 24h o 7D")):
+    """
+    Agregación móvil (p. ej. máximo de las últimas 24 h) en cada observación de la estación.
+    """
+    return await response_cache.respond(request, station_tags(station_code), lambda: work_pool.run(
+        lambda: rolling_series(station_layout(station_code), series, window, station_code=station_code),
+        key=series_key('station-rolling', station_code, window, series=series)))
+
+@router.get('/wind-data/{station_code}/series/exceedance', tags=['Wind Series'])
+async def get_station_exceedance(station_code: int, request: Request, series: SeriesQuery = Depends(), threshold: float = Query(3.0), granularity: str = Query('month', pattern=GRANULARITY_PATTERN.replace('|raw', '')), base: str = Query('hour', pattern=GRANULARITY_PATTERN)):
+    """
+    Porcentaje de horas (o de la base indicada) con velocidad promedio por
+    encima de `threshold`, por cada mes (o la granularidad indicada).
+    """
+    return await response_cache.respond(request, station_tags(station_code), lambda: work_pool.run(
+        lambda: exceedance_series(station_layout(station_code), series, threshold, granularity, base, station_code=station_code),
+        key=series_key('station-exceedance', station_code, threshold, granularity, base, series=series)))
+
+@router.get('/wind-data/municipality/{municipality}/series', tags=['Wind Series'])
+async def get_municipality_series(municipality: str, request: Request, series: SeriesQuery = Depends(), granularity: str = Query('hour', pattern=GRANULARITY_PATTERN)):
+    return await response_cache.respond(request, name_tags('municipality', wind_store.municipality_codes(municipality, exact=True)), lambda: work_pool.run(
+        lambda: resampled_series(municipality_layout(municipality), series, granularity, municipality=municipality),
+        key=series_key('municipality', municipality, granularity, series=series)))
+
+@router.get('/wind-data/municipality/{municipality}/series/rolling', tags=['Wind Series'])
+async def get_municipality_rolling_series(municipality: str, request: Request, series: SeriesQuery = Depends(), window: str = Query('24h', description="p. ej. 30min, 24h o 7D")):
+    return await response_cache.respond(request, name_tags('municipality', wind_store.municipality_codes(municipality, exact=True)), lambda: work_pool.run(
+        lambda: rolling_series(municipality_layout(municipality), series, window, municipality=municipality),
+        key=series_key('municipality-rolling', municipality, window, series=series)))
+
+@router.get('/wind-data/municipality/{municipality}/series/exceedance', tags=['Wind Series'])
+async def get_municipality_exceedance(municipality: str, request: Request, series: SeriesQuery = Depends(), threshold: float = Query(3.0), granularity: str = Query('month', pattern=GRANULARITY_PATTERN.replace('|raw', '')), base: str = Query('hour', pattern=GRANULARITY_PATTERN)):
+    return await response_cache.respond(request, name_tags('municipality', wind_store.municipality_codes(municipality, exact=True)), lambda: work_pool.run(
+        lambda: exceedance_series(municipality_layout(municipality), series, threshold, granularity, base, municipality=municipality),
+        key=series_key('municipality-exceedance', municipality, threshold, granularity, base, series=series)))
+
+
+# Búsquedas de estaciones por ubicación; cada estación incluye su velocidad
+# promedio y, en las búsquedas alrededor de un punto, la distancia en km
+@router.get('/wind-stations/nearest', tags=['Wind Stations'])
+async def get_nearest_stations(latitude: float = Query(ge=-90, le=90), longitude: float = Query(ge=-180, le=180), k: int = Query(5, ge=1, le=100)):
+    return station_index.nearest(latitude, longitude, k)
+
+@router.get('/wind-stations/radius', tags=['Wind Stations'])
+async def get_stations_within_radius(latitude: float = Query(ge=-90, le=90), longitude: float = Query(ge=-180, le=180), radius_km: float = Query(gt=0, le=5000)):
+    return station_index.within_radius(latitude, longitude, radius_km)
+
+@router.get('/wind-stations/bbox', tags=['Wind Stations'])
+async def get_stations_in_bbox(min_latitude: float = Query(ge=-90, le=90), min_longitude: float = Query(ge=-180, le=180), max_latitude: float = Query(ge=-90, le=90), max_longitude: float = Query(ge=-180, le=180)):
+    if min_latitude > max_latitude or min_longitude > max_longitude:
+        raise HTTPException(status_code=400, detail="El mínimo del rectángulo debe ser menor o igual que el máximo")
+    return station_index.in_bbox(min_latitude, min_longitude, max_latitude, max_longitude)
+
+@router.get('/wind-stations/near-place', tags=['Wind Stations'])
+async def get_stations_near_place(municipality: str = None, department: str = None, k: int = Query(3, ge=1, le=100)):
+    """
+    Estaciones más cercanas a un municipio o departamento, ubicado a partir de sus propias estaciones.
+    """
+    stations = station_index.near_place(municipality, department, k)
+    if not stations:
+        raise HTTPException(status_code=404, detail="No se encontraron estaciones para esa ubicación")
+    return stations
+
+
+# Potencial eólico. Las velocidades se extrapolan desde los 10 m del sensor
+# hasta `hub_height` y la energía anual se calcula con la curva de la turbina
+# (una de TURBINES o, en el POST, una curva propia)
+SORT_PATTERN = f"^({'|'.join(POTENTIAL_FIELDS)})$"
+
+def turbine_curve(turbine):
+    if turbine not in TURBINES:
+        raise HTTPException(status_code=400, detail=f"Turbina desconocida: {turbine}. Opciones: {', '.join(TURBINES)}")
+    return TURBINES[turbine]
+
+def potential_ranking(level, curve, hub_height, sort_by, limit):
+    if level == 'station':
+        keys, metrics = power_analyzer.station_potential(curve, hub_height)
+        key_name = 'station_code'
+    else:
+        keys, metrics = power_analyzer.municipality_potential(curve, hub_height)
+        key_name = 'municipality'
+    keys, metrics = rank(keys, metrics, sort_by, limit)
+    return {"level": level, "sort_by": sort_by, "results": potential_records(keys, metrics, key_name)}
+
+class PowerCurveModel(BaseModel):
+    speeds: List[float]
+    power_kw: List[float]
+
+class PotentialRankingRequest(BaseModel):
+    level: str = 'station'
+    hub_height: float = 80.0
+    sort_by: str = 'aep_kwh'
+    limit: Optional[int] = None
+    power_curve: PowerCurveModel
+
+@router.get('/wind-potential/turbines', tags=['Wind Potential'])
+async def get_turbines():
+    return {name: {"speeds": curve.speeds.tolist(), "power_kw": curve.power_kw.round(2).tolist()} for name, curve in TURBINES.items()}
+
+@router.get('/wind-potential/ranking', tags=['Wind Potential'])
+async def get_potential_ranking(level: str = Query('station', pattern='^(station|municipality)$'), turbine: str = DEFAULT_TURBINE, hub_height: float = Query(80.0, gt=0, le=300), sort_by: str = Query('aep_kwh', pattern=SORT_PATTERN), limit: Optional[int] = Query(None, ge=1)):
+    """
+    Ordena todas las estaciones (o municipios) del país por una métrica de potencial eólico.
+    """
+    curve = turbine_curve(turbine)
+    return await work_pool.run(
+        potential_ranking, level, curve, hub_height, sort_by, limit,
+        key=('ranking', wind_store.version, level, turbine, hub_height, sort_by, limit))
+
+@router.post('/wind-potential/ranking', tags=['Wind Potential'])
+async def post_potential_ranking(request: PotentialRankingRequest):
+    """
+    Igual que el GET, pero con una curva de potencia propia.
+    """
+    if request.level not in ('station', 'municipality') or request.sort_by not in POTENTIAL_FIELDS:
+        raise HTTPException(status_code=400, detail="level debe ser station o municipality y sort_by una métrica conocida")
+    if not 0 < request.hub_height <= 300 or (request.limit is not None and request.limit < 1):
+        raise HTTPException(status_code=400, detail="hub_height debe estar entre 0 y 300 m y limit ser positivo")
+    try:
+        curve = power_curve(request.power_curve.speeds, request.power_curve.power_kw)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await work_pool.run(
+        potential_ranking, request.level, curve, request.hub_height, request.sort_by, request.limit,
+        key=('ranking', wind_store.version, request.level, curve.speeds.tobytes(), curve.power_kw.tobytes(),
+             request.hub_height, request.sort_by, request.limit))
+
+@router.get('/wind-potential/station/{station_code}', tags=['Wind Potential'])
+async def get_station_potential(station_code: int, turbine: str = DEFAULT_TURBINE, hub_height: float = Query(80.0, gt=0, le=300)):
+    keys, metrics = await work_pool.run(power_analyzer.station_potential, turbine_curve(turbine), hub_height, [station_code])
+    if not keys:
+        raise HTTPException(status_code=404, detail=f"No se encontraron datos para la estación: {station_code}")
+    return potential_records(keys, metrics, 'station_code')[0]
+
+@router.get('/wind-potential/municipality/{municipality}', tags=['Wind Potential'])
+async def get_municipality_potential(municipality: str, turbine: str = DEFAULT_TURBINE, hub_height: float = Query(80.0, gt=0, le=300)):
+    keys, metrics = await work_pool.run(power_analyzer.municipality_potential, turbine_curve(turbine), hub_height, [municipality])
+    if not keys:
+        raise HTTPException(status_code=404, detail=f"No se encontraron datos para el municipio: {municipality}")
+    return potential_records(keys, metrics, 'municipality')[0]
+
+
+@router.post('/wind-data', tags=['Wind Data'])
+def create_wind_data(station_code: int = Query(ge=CODE_RANGE[0], le=CODE_RANGE[1]), sensor_code: str = Body(), observation_date: str = Body(), observed_value: float = Body(), station_name: str = Body(), department: str = Body(), municipality: str = Body(), hydrographic_zone: str = Body(), latitude: float = Body(), longitude: float = Body(), sensor_description: str = Body(), unit_measure: str = Body()):
     new_wind_data = {
         "station_code": station_code,
         "sensor_code": sensor_code,
@@ -161,14 +384,56 @@ def create_wind_data(station_code: str, sensor_code: str = Body(), observation_d
         "sensor_description": sensor_description,
         "unit_measure": unit_measure
     }
-    wind_data_list.append(new_wind_data)
-    return new_wind_data
-
-@app.put('/wind-data/{station_code}', tags=['Wind Data'])
-def update_wind_data(station_code: str , sensor_code: str = Body(), observation_date: str = Body(), observed_value: float = Body(), station_name: str = Body(), department: str = Body(), municipality: str = Body(), hydrographic_zone: str = Body(), latitude: float = Body(), longitude: float = Body(), sensor_description: str = Body(), unit_measure: str = Body()):
-    for item in wind_data_list:
-        if item['station_code'] == station_code:
-            item.update({
+    # La fila se lee antes de soltar el candado: una compactación cambiaría su id
+    with wind_store.writing():
+        try:
+            row_id = wind_store.append(new_wind_data)
+        except InvalidWindRecord as e:
+            raise HTTPException(status_code=422, detail={"invalid": e.invalid})
+        return wind_store.records([row_id])[0]
+
+@router.post('/wind-data/bulk', tags=['Wind Data'])
+async def bulk_create_wind_data(request: Request):
+    """
+    Carga masiva de observaciones: un arreglo JSON, NDJSON, CSV o Parquet
+    según la cabecera Content-Type. Las filas válidas se agregan en lote y se
+    devuelve un resumen con las aceptadas, las rechazadas y los primeros errores.
+    """
+    content_type = request.headers.get('content-type', 'application/json').split(';')[0].strip()
+    if content_type not in BULK_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail=f"Tipo de contenido no soportado: {content_type}")
+
+    # El cuerpo se copia por partes a un archivo temporal para leerlo por
+    # lotes; la lectura, la validación y la inserción corren en el pool para
+    # no bloquear el event loop
+    handle = tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_SIZE)
+    try:
+        async for chunk in request.stream():
+            handle.write(chunk)
+        handle.seek(0)
+        future = work_pool.submit(ingest_upload, handle, content_type)
+    except BaseException:
+        handle.close()
+        raise
+    return await work_pool.result(future)
+
+def ingest_upload(handle, content_type):
+    # El archivo se cierra aquí y no en la ruta: si la ruta responde 504, la
+    # carga sigue hasta terminar
+    with handle:
+        try:
+            return ingest_frames(wind_store, read_bulk_frames(handle, content_type))
+        except ImportError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"No se pudo leer la carga: {e}")
+
+@router.put('/wind-data/{station_code}', tags=['Wind Data'])
+def update_wind_data(station_code: int, sensor_code: str = Body(), observation_date: str = Body(), observed_value: float = Body(), station_name: str = Body(), department: str = Body(), municipality: str = Body(), hydrographic_zone: str = Body(), latitude: float = Body(), longitude: float = Body(), sensor_description: str = Body(), unit_measure: str = Body()):
+    # Actualiza en su lugar la primera fila de la estación, buscada en el índice
+    with wind_store.writing():
+        try:
+            row_id = wind_store.update_station(station_code, {
                 "sensor_code": sensor_code,
                 "observation_date": observation_date,
                 "observed_value": observed_value,
@@ -181,16 +446,22 @@ def update_wind_data(station_code: str , sensor_code: str = Body(), observation_
                 "sensor_description": sensor_description,
                 "unit_measure": unit_measure
             })
-            return item
-    return {"Estación no encontrada"}
+        except InvalidWindRecord as e:
+            raise HTTPException(status_code=422, detail={"invalid": e.invalid})
+        if row_id is None:
+            return {"Estación no encontrada"}
+        return wind_store.records([row_id])[0]
 
-@app.delete('/wind-data/{station_code}', tags=['Wind Data'])
-def delete_wind_data(station_code: str):
-    global wind_data_list
-    wind_data_list = [item for item in wind_data_list if item['station_code'] != station_code]
+@router.delete('/wind-data/{station_code}', tags=['Wind Data'])
+def delete_wind_data(station_code: int):
+    # Marca como borradas las filas de la estación; se compactan más adelante
+    wind_store.delete_station(station_code)
     return {"Estación de viento borrada exitosamente"}
 
 
+app.include_router(router)
+
+
 #para correr la app: uvicorn main:app --reload
 #uvirconr nombreApp:app --reload --port 5000
 # http://127.0.0.1:8000/docs
@@ -1,35 +1,47 @@
-from fastapi import FastAPI, HTTPException
+import io
+
+from fastapi import APIRouter, FastAPI, HTTPException, Query
 from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi import Request
+from fastapi import Request, Response
 from pydantic import BaseModel
+from typing import List, Optional
+
+from analitica_chat import RETENCION_SEGUNDOS, VENTANAS, BuscadorTerminos, ContadoresTerminos, terminos_configurados
+from calculo_consumo import ELECTRODOMESTICOS, calcular_consumo_hogar, calcular_consumo_lote, leer_hogares_csv, resultados_csv
+from configuracion import load_settings
+from dialogo_chat import Dialogo, Paso, RespuestaInvalida, lista_numeros, numero, texto
+from ejecucion import get_work_pool
+from metricas import install_metrics
+from sesiones_chat import COOKIE_SESION, TTL_SESION, crear_almacen_sesiones, estado_inicial, id_sesion_de, nuevo_id_sesion
 
+# Las rutas se definen en un router para poder montarlas en la aplicación
+# combinada (main.py); `app` sirve el chat por separado
+router = APIRouter()
 app = FastAPI()
+install_metrics(app)
+
+settings = load_settings()
 
-# Constantes de consumo de energía
-ELECTRODOMESTICOS = {
-    "nevera": 1.2,  # kWh por hora
-    "lavadora": 0.5,
-    "televisor": 0.1,
-    "computador": 0.2,
-    "aire_acondicionado": 1.5,
-    "microondas": 1.2,
-}
+# Estado de cada conversación (respuestas del usuario y contadores de las
+# palabras "ahorro" y "energía"), separado por sesión
+sesiones = crear_almacen_sesiones(settings.chat_sessions_url)
 
-PRECIOS_KWH = {
-    1: 200,
-    2: 300,
-    3: 400,
-    4: 500,
-    5: 600,
-    6: 700,
-    7: 700,
-}
+# Términos que se cuentan en los mensajes y sus contadores por hilo
+buscador_terminos = BuscadorTerminos(terminos_configurados(settings.chat_terms))
+contadores_terminos = ContadoresTerminos()
 
-# Variable global para almacenar las respuestas del usuario
-usuario_info = {}
+# Los cálculos por lotes corren en el pool de trabajo pesado para no bloquear
+# el event loop, que atiende también las conversaciones del chat
+work_pool = get_work_pool()
 
-# Contadores de las palabras "ahorro" y "energía"
-palabra_count = {"ahorro": 0, "energia": 0}
+# Índice de estaciones de viento (ver ubicacion_viento.StationIndex). Lo
+# configura la aplicación que también carga los datos de viento; sin él, el
+# chat funciona igual pero no menciona las estaciones cercanas.
+indice_estaciones = None
+
+def configurar_datos_viento(indice):
+    global indice_estaciones
+    indice_estaciones = indice
 
 # Modelo Pydantic para enviar los contadores
 class PalabraCount(BaseModel):
@@ -37,7 +49,7 @@ class PalabraCount(BaseModel):
     energia: int
 
 # Ruta inicial: Interfaz de chat
-@app.get("/", response_class=HTMLResponse)
+@router.get("/", response_class=HTMLResponse)
 async def inicio():
     return """
     <html>
@@ -132,132 +144,182 @@ async def inicio():
     """
 
 # Ruta para recibir y procesar las respuestas del usuario
-@app.post("/chat/{mensaje}")
-async def chat(mensaje: str):
-    global usuario_info, palabra_count
-    # Contamos las menciones de las palabras "ahorro" y "energía"
-    for palabra in mensaje.lower().split():
-        if "ahorro" in palabra:
-            palabra_count["ahorro"] += 1
-        if "energia" in palabra:
-            palabra_count["energia"] += 1
-    
-    if 'nombre' not in usuario_info:
-        usuario_info['nombre'] = mensaje
-        return {"mensaje": f"Hola {mensaje}, ahora, cuentanos como te ayudaria en tu hogar la implementación de metodos de generación alternativos de energia?"}
-    
-    if 'porque?' not in usuario_info:
-        usuario_info['porque?'] = mensaje
-        return {"mensaje": f"¡Que interesnte razón! ¿En qué departamento vives?"}
-    
-    if 'departamento' not in usuario_info:
-        usuario_info['departamento'] = mensaje
-        return {"mensaje": f"Perfecto, ahora, ¿en qué municipio vives en {mensaje}?"}
-    
-    if 'municipio' not in usuario_info:
-        usuario_info['municipio'] = mensaje
-        return {"mensaje": f"Genial, ahora, ¿cuántas personas viven en tu casa?"}
-    
-    if 'personas' not in usuario_info:
-        try:
-            usuario_info['personas'] = int(mensaje)
-            return {
-                "mensaje": "Perfecto, a continuación, selecciona las horas de uso diario para los electrodomésticos más comunes:\n" +
-                           "\n".join([f"{i + 1}. {electro}" for i, electro in enumerate(ELECTRODOMESTICOS.keys())]) +
-                           "\nPor favor, ingresa las horas de uso en el orden indicado, separadas por comas (por ejemplo: 5,2,3,0,4)."
-            }
-        except ValueError:
-            return {"mensaje": "Por favor, ingresa un número válido de personas."}
-    
-    if 'electrodomesticos' not in usuario_info:
-        try:
-            # Convertir la respuesta del usuario en una lista de horas
-            horas = list(map(float, mensaje.split(",")))
-            if len(horas) != len(ELECTRODOMESTICOS):
-                return {"mensaje": f"Por favor, ingresa exactamente {len(ELECTRODOMESTICOS)} valores separados por comas."}
-            
-            # Mapear las horas a los electrodomésticos
-            usuario_info['electrodomesticos'] = {
-                electro: horas[i]
-                for i, electro in enumerate(ELECTRODOMESTICOS.keys())
-            }
-            return {"mensaje": "¡Listo! Ahora, por favor indícame tu estrato social (un número entre 1 y 7)."}
+@router.post("/chat/{mensaje}")
+async def chat(mensaje: str, request: Request, response: Response):
+    id_sesion = id_sesion_de(request)
+    estado = sesiones.obtener(id_sesion) if id_sesion else None
+    if estado is None:
+        # Sesión nueva o vencida: se empieza la conversación desde el principio
+        id_sesion = id_sesion or nuevo_id_sesion()
+        estado = estado_inicial()
+    response.set_cookie(COOKIE_SESION, id_sesion, max_age=TTL_SESION, httponly=True, samesite="lax")
+    response.headers["X-Session-Id"] = id_sesion
+    try:
+        return dialogo.responder(estado, mensaje)
+    finally:
+        sesiones.guardar(id_sesion, estado)
+
+# Ruta con los términos más mencionados, en total y por ventanas de tiempo
+@router.get("/stats")
+async def estadisticas(
+    top: int = Query(10, ge=1, le=100),
+    ventana: Optional[int] = Query(None, ge=1, le=RETENCION_SEGUNDOS, description="Ventana adicional en segundos"),
+):
+    ventanas = VENTANAS if ventana is None else tuple(sorted({*VENTANAS, ventana}))
+    return contadores_terminos.estadisticas(top, ventanas)
 
-        except ValueError:
-            return {"mensaje": "Por favor, ingresa solo números separados por comas (por ejemplo: 5,2,3,0,4)."}
+# Contamos las menciones de los términos de interés, sin importar tildes ni
+# mayúsculas; la sesión guarda las de "ahorro" y "energía"
+def contar_palabras(mensaje, palabra_count):
+    conteo = buscador_terminos.buscar(mensaje)
+    contadores_terminos.registrar(conteo)
+    for palabra in palabra_count:
+        palabra_count[palabra] += conteo.get(palabra, 0)
 
-    if 'estrato' not in usuario_info:
-        try:
-            estrato = int(mensaje)
-            if 1 <= estrato <= 7:
-                usuario_info['estrato'] = estrato
-                return {"mensaje": "Por último, ¿qué porcentaje consumo quieres ahorrar con paneles solares? (Ingresa un número entre 0 y 100)."}
-            else:
-                return {"mensaje": "El estrato debe estar entre 1 y 7. Intenta nuevamente."}
-        except ValueError:
-            return {"mensaje": "Por favor, ingresa un número válido entre 1 y 7."}
-    
-    if 'panel_solar_porcentaje' not in usuario_info:
-        try:
-            porcentaje = float(mensaje)
-            if 0 <= porcentaje <= 100:
-                usuario_info['panel_solar_porcentaje'] = porcentaje / 100  # Convertir a decimal
-                return calcular_consumo()
-            else:
-                return {"mensaje": "El porcentaje debe estar entre 0 y 100. Intenta nuevamente."}
-        except ValueError:
-            return {"mensaje": "Por favor, ingresa un porcentaje válido como un número entre 0 y 100."}
-    
+def respuesta_final(usuario_info, palabra_count):
     # Devolvemos los contadores de palabras con el mensaje
     return {"mensaje": "¡Gracias por completar el formulario!", "palabra_count": palabra_count}
 
 # Función para calcular el consumo y costos
-def calcular_consumo():
-    global usuario_info, palabra_count
-
-    # Calcular el consumo de energía
-    consumo_diario = sum(
-        ELECTRODOMESTICOS[electro] * horas
-        for electro, horas in usuario_info['electrodomesticos'].items()
-    ) * usuario_info['personas']
-    
-    consumo_mensual = consumo_diario * 30
-    consumo_anual = consumo_mensual * 12
-
-    # Costos sin ahorro
-    costo_diario = consumo_diario * PRECIOS_KWH[usuario_info['estrato']]
-    costo_mensual = consumo_mensual * PRECIOS_KWH[usuario_info['estrato']]
-    costo_anual = consumo_anual * PRECIOS_KWH[usuario_info['estrato']]
-
-    # Ahorros con paneles solares
-    ahorro_diario = costo_diario * usuario_info['panel_solar_porcentaje']
-    ahorro_mensual = costo_mensual * usuario_info['panel_solar_porcentaje']
-    ahorro_anual = costo_anual * usuario_info['panel_solar_porcentaje']
-
-    # Costos con ahorro
-    costo_diario_con_ahorro = costo_diario - ahorro_diario
-    costo_mensual_con_ahorro = costo_mensual - ahorro_mensual
-    costo_anual_con_ahorro = costo_anual - ahorro_anual
+def calcular_consumo(usuario_info, palabra_count):
+    try:
+        r = calcular_consumo_hogar(usuario_info)
+    except ValueError as e:
+        # Los pasos ya validan los rangos del cálculo; si aun así falla, la
+        # sesión se queda en este paso en lugar de quedar atascada
+        raise RespuestaInvalida(f"No pudimos calcular el consumo con esos datos ({e}). Intenta nuevamente.")
 
     # Mensaje final con resultados y contadores de palabras
     return {
         "mensaje": f"Resumen del consumo y costos:\n\n"
-                   f"Consumo Diario: {consumo_diario:.2f} kWh\n"
-                   f"Consumo Mensual: {consumo_mensual:.2f} kWh\n"
-                   f"Consumo Anual: {consumo_anual:.2f} kWh\n"
+                   f"Consumo Diario: {r['consumo_diario']:.2f} kWh\n"
+                   f"Consumo Mensual: {r['consumo_mensual']:.2f} kWh\n"
+                   f"Consumo Anual: {r['consumo_anual']:.2f} kWh\n"
                    f"\nCostos sin ahorro:\n"
-                   f"Costo Diario: ${costo_diario:.2f} COP\n"
-                   f"Costo Mensual: ${costo_mensual:.2f} COP\n"
-                   f"Costo Anual: ${costo_anual:.2f} COP\n"
+                   f"Costo Diario: ${r['costo_diario']:.2f} COP\n"
+                   f"Costo Mensual: ${r['costo_mensual']:.2f} COP\n"
+                   f"Costo Anual: ${r['costo_anual']:.2f} COP\n"
                    f"\nAhorros por paneles solares:\n"
-                   f"Ahorro Diario: ${ahorro_diario * PRECIOS_KWH[usuario_info['estrato']] :.2f} COP\n"
-                   f"Ahorro Mensual: ${ahorro_mensual * PRECIOS_KWH[usuario_info['estrato']] :.2f} COP\n"
-                   f"Ahorro Anual: ${ahorro_anual * PRECIOS_KWH[usuario_info['estrato']] :.2f} COP\n"
+                   f"Ahorro Diario: ${r['ahorro_diario']:.2f} COP\n"
+                   f"Ahorro Mensual: ${r['ahorro_mensual']:.2f} COP\n"
+                   f"Ahorro Anual: ${r['ahorro_anual']:.2f} COP\n"
                    f"\nCostos con ahorro:\n"
-                   f"Costo Diario: ${costo_diario_con_ahorro:.2f} COP\n"
-                   f"Costo Mensual: ${costo_mensual_con_ahorro:.2f} COP\n"
-                   f"Costo Anual: ${costo_anual_con_ahorro:.2f} COP\n"
+                   f"Costo Diario: ${r['costo_con_ahorro_diario']:.2f} COP\n"
+                   f"Costo Mensual: ${r['costo_con_ahorro_mensual']:.2f} COP\n"
+                   f"Costo Anual: ${r['costo_con_ahorro_anual']:.2f} COP\n"
                    f"\nConteo de palabras:\n"
                    f"Ahorro mencionado: {palabra_count['ahorro']} veces\n"
-                   f"Energía mencionada: {palabra_count['energia']} veces"
+                   f"Energía mencionada: {palabra_count['energia']} veces",
+        "resultados": {nombre: round(valor, 2) for nombre, valor in r.items()},
     }
+
+# Modelo Pydantic para calcular muchos hogares a la vez. Cada lista tiene un
+# valor por hogar (o uno solo, que se aplica a todos); las horas van en el
+# orden de ELECTRODOMESTICOS y el porcentaje solar de 0 a 100.
+class HogaresLote(BaseModel):
+    personas: List[float]
+    horas: List[List[float]]
+    estrato: List[int]
+    panel_solar_porcentaje: List[float]
+
+def respuesta_lote(personas, horas, estrato, panel_solar_porcentaje, formato):
+    try:
+        resultados = calcular_consumo_lote(personas, horas, estrato, panel_solar_porcentaje)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if formato == "csv":
+        return Response(resultados_csv(resultados), media_type="text/csv")
+    return JSONResponse({
+        "hogares": int(resultados["consumo_diario"].size),
+        "resultados": {nombre: valores.round(2).tolist() for nombre, valores in resultados.items()},
+    })
+
+def respuesta_lote_csv(cuerpo, formato):
+    try:
+        personas, horas, estrato, panel_solar_porcentaje = leer_hogares_csv(io.BytesIO(cuerpo))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return respuesta_lote(personas, horas, estrato, panel_solar_porcentaje, formato)
+
+# Ruta para calcular el consumo de muchos hogares en formato JSON por columnas
+@router.post("/consumo/lote")
+async def consumo_lote(hogares: HogaresLote, formato: str = Query("json", pattern="^(json|csv)$")):
+    return await work_pool.run(
+        respuesta_lote,
+        hogares.personas,
+        hogares.horas,
+        hogares.estrato,
+        [porcentaje / 100 for porcentaje in hogares.panel_solar_porcentaje],
+        formato,
+    )
+
+# Ruta para calcular el consumo de muchos hogares a partir de un CSV
+@router.post("/consumo/lote/csv")
+async def consumo_lote_csv(request: Request, formato: str = Query("csv", pattern="^(json|csv)$")):
+    return await work_pool.run(respuesta_lote_csv, await request.body(), formato)
+
+# Después del municipio se menciona la estación de viento más cercana, si hay datos de viento
+def respuesta_municipio(usuario_info, palabra_count):
+    mensaje = "Genial, ahora, ¿cuántas personas viven en tu casa?"
+    if indice_estaciones is None:
+        return {"mensaje": mensaje}
+    lugar = indice_estaciones.locate_place(usuario_info['municipio'], usuario_info['departamento'])
+    if lugar is None:
+        return {"mensaje": mensaje, "estaciones_cercanas": []}
+    latitud, longitud, nivel = lugar
+    estaciones = indice_estaciones.nearest(latitud, longitud, k=3)
+    estacion = estaciones[0]
+    velocidad = "" if estacion['mean_speed'] is None else f", con una velocidad promedio de {estacion['mean_speed']:.2f} m/s"
+    # Si el municipio no tiene estaciones se usa el centro del departamento, y se avisa
+    referencia = ""
+    if nivel == 'department':
+        referencia = (f"No encontré estaciones en {usuario_info['municipio']}, así que tomé como referencia "
+                      f"el departamento de {usuario_info['departamento']}. ")
+    return {
+        "mensaje": referencia + f"La estación de viento más cercana es {estacion['station_name']} ({estacion['municipality']}), "
+                   f"a {estacion['distance_km']:.1f} km{velocidad}. " + mensaje,
+        "estaciones_cercanas": estaciones,
+        "ubicacion_aproximada": nivel == 'department',
+    }
+
+# Porcentaje de ahorro con paneles solares, convertido a decimal
+validar_porcentaje = numero(
+    float,
+    "Por favor, ingresa un porcentaje válido como un número entre 0 y 100.",
+    0, 100, "El porcentaje debe estar entre 0 y 100. Intenta nuevamente.",
+)
+
+# Pasos del diálogo, en orden. Las preguntas se arman una sola vez al cargar
+# el módulo; para agregar una pregunta basta con agregar un Paso a la tabla.
+PASOS = [
+    Paso('nombre', texto,
+         "Hola {valor}, ahora, cuentanos como te ayudaria en tu hogar la implementación de metodos de generación alternativos de energia?"),
+    Paso('porque?', texto,
+         "¡Que interesnte razón! ¿En qué departamento vives?"),
+    Paso('departamento', texto,
+         "Perfecto, ahora, ¿en qué municipio vives en {valor}?"),
+    Paso('municipio', texto, respuesta_municipio),
+    Paso('personas',
+         numero(int, "Por favor, ingresa un número válido de personas.",
+                0, None, "El número de personas no puede ser negativo. Intenta nuevamente."),
+         "Perfecto, a continuación, selecciona las horas de uso diario para los electrodomésticos más comunes:\n" +
+         "\n".join([f"{i + 1}. {electro}" for i, electro in enumerate(ELECTRODOMESTICOS.keys())]) +
+         "\nPor favor, ingresa las horas de uso en el orden indicado, separadas por comas (por ejemplo: 5,2,3,0,4)."),
+    Paso('electrodomesticos',
+         lista_numeros(
+             list(ELECTRODOMESTICOS),
+             "Por favor, ingresa solo números separados por comas (por ejemplo: 5,2,3,0,4).",
+             f"Por favor, ingresa exactamente {len(ELECTRODOMESTICOS)} valores separados por comas.",
+             0, 24, "Las horas de uso deben estar entre 0 y 24. Intenta nuevamente.",
+         ),
+         "¡Listo! Ahora, por favor indícame tu estrato social (un número entre 1 y 7)."),
+    Paso('estrato',
+         numero(int, "Por favor, ingresa un número válido entre 1 y 7.",
+                1, 7, "El estrato debe estar entre 1 y 7. Intenta nuevamente."),
+         "Por último, ¿qué porcentaje consumo quieres ahorrar con paneles solares? (Ingresa un número entre 0 y 100)."),
+    Paso('panel_solar_porcentaje', lambda mensaje: validar_porcentaje(mensaje) / 100, calcular_consumo),
+]
+
+dialogo = Dialogo(PASOS, contar_palabras, respuesta_final)
+
+app.include_router(router)
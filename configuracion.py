@@ -0,0 +1,113 @@
+import json
+import os
+from collections import namedtuple
+
+# Configuración compartida por las APIs. Cada valor se toma, en orden, de su
+# variable de entorno, del archivo JSON indicado en ENERGIA_CONFIG (por
+# defecto energia.json en el directorio de trabajo, si existe) o del valor
+# por defecto.
+Settings = namedtuple('Settings', [
+    'wind_data_path',
+    'wind_snapshot_dir',
+    'wind_drop_missing_values',
+    'enable_wind_api',
+    'enable_wind_classifier',
+    'enable_chat',
+    'chat_sessions_url',
+    'chat_terms',
+    'work_pool_workers',
+    'work_pool_queue',
+    'work_timeout_seconds',
+    'response_cache_bytes',
+    'model_keep_versions',
+])
+
+DEFAULT_SETTINGS = {
+    # CSV de viento del IDEAM; por defecto el de prueba que acompaña al código
+    'wind_data_path': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Velocidades_viento_prueba.csv'),
+    # Directorio de instantáneas; por defecto .snapshots_viento junto al CSV
+    'wind_snapshot_dir': None,
+    # Descartar al cargar las filas sin valor observado numérico
+    'wind_drop_missing_values': False,
+    # Componentes que monta la aplicación combinada (main.py)
+    'enable_wind_api': True,
+    'enable_wind_classifier': True,
+    'enable_chat': True,
+    # Backend de sesiones del chat: memoria, sqlite:///ruta.db o redis://...
+    'chat_sessions_url': 'memoria',
+    # Términos que cuenta la analítica del chat, separados por comas
+    'chat_terms': None,
+    # Hilos para el trabajo pesado de las rutas, peticiones que pueden esperar
+    # turno antes de responder 503 y segundos antes de responder 504
+    'work_pool_workers': os.cpu_count() or 4,
+    'work_pool_queue': 64,
+    'work_timeout_seconds': 30.0,
+    # Bytes de respuestas serializadas que se guardan en caché; con 0 no se
+    # guarda ninguna, pero se siguen enviando ETag y respondiendo 304
+    'response_cache_bytes': 64 * 1024 * 1024,
+    # Versiones del modelo de viento que se conservan en disco
+    'model_keep_versions': 5,
+}
+
+ENVIRONMENT_VARIABLES = {
+    'wind_data_path': 'WIND_DATA_PATH',
+    'wind_snapshot_dir': 'WIND_SNAPSHOT_DIR',
+    'wind_drop_missing_values': 'WIND_DROP_MISSING_VALUES',
+    'enable_wind_api': 'ENABLE_WIND_API',
+    'enable_wind_classifier': 'ENABLE_WIND_CLASSIFIER',
+    'enable_chat': 'ENABLE_CHAT',
+    'chat_sessions_url': 'CHAT_SESIONES_URL',
+    'chat_terms': 'CHAT_TERMINOS',
+    'work_pool_workers': 'WORK_POOL_WORKERS',
+    'work_pool_queue': 'WORK_POOL_QUEUE',
+    'work_timeout_seconds': 'WORK_TIMEOUT_SECONDS',
+    'response_cache_bytes': 'RESPONSE_CACHE_BYTES',
+    'model_keep_versions': 'MODEL_KEEP_VERSIONS',
+}
+
+CONFIG_FILE = 'energia.json'
+
+TRUE_VALUES = ('1', 'true', 'yes', 'si', 'sí', 'on')
+
+_settings = None
+
+
+def _convert(name, value):
+    default = DEFAULT_SETTINGS[name]
+    if not isinstance(value, str):
+        return value
+    if isinstance(default, bool):
+        return value.strip().lower() in TRUE_VALUES
+    if isinstance(default, (int, float)):
+        return type(default)(value)
+    return value
+
+
+def read_settings(environ=None):
+    """Lee la configuración del entorno y del archivo de configuración."""
+    environ = os.environ if environ is None else environ
+    values = dict(DEFAULT_SETTINGS)
+
+    config_path = environ.get('ENERGIA_CONFIG', CONFIG_FILE)
+    if os.path.exists(config_path):
+        with open(config_path, encoding='utf-8') as handle:
+            from_file = json.load(handle)
+        unknown = sorted(set(from_file) - set(DEFAULT_SETTINGS))
+        if unknown:
+            raise ValueError(f"Opciones desconocidas en {config_path}: {', '.join(unknown)}")
+        values.update(from_file)
+    elif 'ENERGIA_CONFIG' in environ:
+        raise FileNotFoundError(f"No existe el archivo de configuración: {config_path}")
+
+    for name, variable in ENVIRONMENT_VARIABLES.items():
+        if environ.get(variable):
+            values[name] = environ[variable]
+    return Settings(**{name: _convert(name, value) for name, value in values.items()})
+
+
+def load_settings():
+    """Configuración del proceso; se lee una sola vez."""
+    global _settings
+    if _settings is None:
+        _settings = read_settings()
+    return _settings
@@ -0,0 +1,102 @@
+import os
+import threading
+
+from cache_viento import ResponseCache
+from configuracion import load_settings
+from datos_viento import WindStore
+from metricas import LOAD_ERRORS
+from modelo_viento import ModelManager
+from potencia_viento import WindPowerAnalyzer
+from series_viento import WindSeries
+from snapshot_viento import load_wind_store
+from ubicacion_viento import StationIndex
+
+_context = None
+_context_lock = threading.Lock()
+
+
+class WindContext:
+    """Datos de viento compartidos por todas las APIs de un proceso.
+
+    El almacén se carga una sola vez; las estructuras derivadas (series,
+    índice espacial, potencial eólico, modelo y caché de respuestas) se
+    crean la primera vez que alguna API las pide y quedan suscritas a las
+    mutaciones del almacén.
+    """
+
+    def __init__(self, store, snapshot_directory=None):
+        self.store = store
+        self.snapshot_directory = snapshot_directory
+        self._lock = threading.Lock()
+        self._components = {}
+
+    def _component(self, name, create):
+        with self._lock:
+            component = self._components.get(name)
+            if component is None:
+                component = self._components[name] = create()
+            return component
+
+    def _listening(self, component):
+        self.store.add_listener(component.on_store_change)
+        return component
+
+    @property
+    def series(self):
+        return self._component('series', lambda: self._listening(WindSeries(self.store)))
+
+    @property
+    def station_index(self):
+        return self._component('station_index', lambda: self._listening(StationIndex(self.store)))
+
+    @property
+    def power_analyzer(self):
+        return self._component('power_analyzer', lambda: self._listening(WindPowerAnalyzer(self.store)))
+
+    @property
+    def response_cache(self):
+        return self._component('response_cache', lambda: self._listening(
+            ResponseCache(self.store, load_settings().response_cache_bytes)))
+
+    @property
+    def model_manager(self):
+        return self._component('model_manager', self._load_model_manager)
+
+    def _load_model_manager(self):
+        # Gestor del modelo Naive Bayes: carga la última versión guardada o la
+        # entrena en segundo plano, y la actualiza cuando cambian los datos
+        models_directory = os.path.join(self.snapshot_directory, 'models') if self.snapshot_directory else None
+        manager = ModelManager(models_directory, load_settings().model_keep_versions)
+        try:
+            loaded = manager.load_latest()
+        except Exception as e:
+            print(f"Error al cargar el modelo: {e}")
+            loaded = False
+        if not loaded and len(self.store):
+            manager.train_async(self.store)
+        return self._listening(manager)
+
+
+def load_wind_context(settings):
+    try:
+        # Usa la instantánea en disco si existe; si no, lee el CSV por lotes,
+        # omitiendo líneas problemáticas, y guarda la instantánea
+        store, directory = load_wind_store(
+            settings.wind_data_path,
+            drop_missing_values=settings.wind_drop_missing_values,
+            snapshot_dir=settings.wind_snapshot_dir,
+        )
+    except Exception as e:
+        LOAD_ERRORS.inc()
+        print(f"Error al cargar los datos: {e}")
+        store, directory = WindStore(), None
+    return WindContext(store, directory)
+
+
+def get_wind_context():
+    """Contexto de datos de viento del proceso, cargado en la primera llamada."""
+    global _context
+    with _context_lock:
+        if _context is None:
+            _context = load_wind_context(load_settings())
+        return _context
@@ -0,0 +1,1153 @@
+import functools
+import json
+import os
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from analitica_chat import normalizar
+from metricas import ROWS_LOADED, ROWS_SKIPPED, span
+
+# Columnas del dataset de viento en el orden en que se devuelven por la API
+COLUMNS = (
+    'station_code',
+    'sensor_code',
+    'observation_date',
+    'observed_value',
+    'station_name',
+    'department',
+    'municipality',
+    'hydrographic_zone',
+    'latitude',
+    'longitude',
+    'sensor_description',
+    'unit_measure',
+)
+
+# Renombramiento de las columnas del CSV del IDEAM
+CSV_COLUMNS = {
+    'codigoestacion': 'station_code',
+    'codigosensor': 'sensor_code',
+    'fechaobservacion': 'observation_date',
+    'valorobservado': 'observed_value',
+    'nombreestacion': 'station_name',
+    'departamento': 'department',
+    'municipio': 'municipality',
+    'zonahidrografica': 'hydrographic_zone',
+    'latitud': 'latitude',
+    'longitud': 'longitude',
+    'descripcionsensor': 'sensor_description',
+    'unidadmedida': 'unit_measure',
+}
+
+# Tipos explícitos para leer el CSV; los valores numéricos se convierten después
+# con `pd.to_numeric` para que un valor mal formado no aborte el lote completo
+CSV_DTYPES = {name: str for name in CSV_COLUMNS}
+
+# Número de filas que se leen del CSV en cada lote
+CHUNK_SIZE = 100_000
+
+# Clases de potencial eólico y límites de velocidad (m/s) entre ellas:
+# < 1.0 es 'Mala', entre 1.0 y 2.0 (inclusive) es 'Buena' y > 2.0 es 'Excelente'
+WIND_CLASSES = ('Mala', 'Buena', 'Excelente')
+WIND_CLASS_BINS = np.array([1.0, np.nextafter(2.0, np.inf)])
+
+# Columnas numéricas: se guardan como arreglos de NumPy con tipo fijo
+NUMERIC_COLUMNS = {
+    'station_code': np.int32,
+    'sensor_code': np.int32,
+    'observation_date': 'datetime64[ns]',
+    'observed_value': np.float64,
+    'latitude': np.float64,
+    'longitude': np.float64,
+}
+
+# Códigos de estación y sensor: enteros compactos; los que no caben en int32
+# se rechazan en lugar de desbordarse al convertirlos
+CODE_COLUMNS = ('station_code', 'sensor_code')
+CODE_RANGE = (0, np.iinfo(np.int32).max)
+
+# Rangos válidos (territorio colombiano y velocidades físicamente posibles) que
+# se usan para reubicar la coma decimal en números con separadores de miles
+LATITUDE_RANGE = (-5.0, 14.0)
+LONGITUDE_RANGE = (-82.0, -66.0)
+WIND_SPEED_RANGE = (0.0, 60.0)
+
+# Columnas con índice hash y agregados precalculados
+INDEXED_COLUMNS = ('station_code', 'municipality', 'hydrographic_zone')
+
+# Fracción de filas borradas a partir de la cual se compactan las columnas
+COMPACTION_RATIO = 0.25
+
+# Columnas de texto con pocos valores distintos: se guardan como códigos enteros
+# más una tabla de categorías
+CATEGORY_COLUMNS = (
+    'station_name',
+    'department',
+    'municipality',
+    'hydrographic_zone',
+    'sensor_description',
+    'unit_measure',
+)
+
+# Valores por defecto para evitar NaN en las respuestas JSON
+DEFAULTS = {
+    'station_code': 0,
+    'sensor_code': 0,
+    'observation_date': pd.NaT,
+    'observed_value': 0.0,
+    'station_name': '',
+    'department': '',
+    'municipality': '',
+    'hydrographic_zone': '',
+    'latitude': 0.0,
+    'longitude': 0.0,
+    'sensor_description': '',
+    'unit_measure': '',
+}
+
+
+# Cambio en el almacén que se notifica a los suscriptores: la acción
+# ('insert', 'update' o 'delete'), las filas afectadas y, por cada columna
+# indexada, el conjunto de claves tocadas (antes y después del cambio)
+WindChange = namedtuple('WindChange', ['action', 'rows', 'keys'])
+
+
+def normalize_name(value):
+    """Normaliza un nombre para las búsquedas sin distinguir mayúsculas ni tildes."""
+    return normalizar(str(value))
+
+
+def classify_wind_codes(values):
+    """Clasifica un arreglo de velocidades; devuelve índices sobre `WIND_CLASSES`."""
+    return np.digitize(np.asarray(values, dtype=np.float64), WIND_CLASS_BINS)
+
+
+def parse_localized_numbers(values, low, high, max_integer_digits=3):
+    """Convierte a float una columna de números escritos con separadores de miles.
+
+    El export del IDEAM trae valores como '1.925.916.667' o '-7.642.755.556',
+    donde se perdió la coma decimal. Los valores con un solo punto (o coma) se
+    leen como decimales normales. Los que tienen forma de separadores de
+    miles (grupos de tres dígitos) y no quedan dentro de [`low`, `high`] se
+    reinterpretan: se quitan los separadores y se ubica la coma decimal tras
+    el menor número de dígitos enteros que deja el valor dentro del rango.
+    Lo que sigue fuera del rango (p. ej. '61.5' como velocidad, o una latitud
+    en la columna de longitud) queda en NaN. Todo se hace por columna, sin
+    recorrer las filas en Python.
+    """
+    text = pd.Series(values, dtype=object).astype(str).str.strip().str.replace(',', '.', regex=False)
+    result = pd.to_numeric(text.where(text.str.count(r'\.') <= 1), errors='coerce').to_numpy(dtype=np.float64, copy=True)
+
+    digits = text.str.replace(r'[^0-9]', '', regex=True)
+    magnitude = pd.to_numeric(digits.where(digits != ''), errors='coerce').to_numpy(dtype=np.float64)
+    exponent = digits.str.len().to_numpy(dtype=np.float64)
+    sign = np.where(text.str.startswith('-').to_numpy(dtype=bool), -1.0, 1.0)
+    grouped = text.str.fullmatch(r'-?\d{1,3}(?:\.\d{3})+').to_numpy(dtype=bool)
+
+    pending = ~((result >= low) & (result <= high)) & grouped
+    for integer_digits in range(1, max_integer_digits + 1):
+        candidate = sign * magnitude / 10.0 ** (exponent - integer_digits)
+        valid = pending & (candidate >= low) & (candidate <= high)
+        result[valid] = candidate[valid]
+        pending &= ~valid
+    result[~((result >= low) & (result <= high))] = np.nan
+    return result
+
+
+def parse_wind_frame(df):
+    """Selecciona, renombra y convierte las columnas sin rellenar los valores faltantes.
+
+    Las coordenadas y el valor observado se convierten a float, la fecha a
+    datetime64 y los códigos a número; lo que no se puede leer, o queda fuera
+    de su rango válido, queda en NaN.
+    """
+    df = df.rename(columns=CSV_COLUMNS)
+    df = df.reindex(columns=list(COLUMNS))
+
+    df['observed_value'] = parse_localized_numbers(df['observed_value'], *WIND_SPEED_RANGE)
+    df['latitude'] = parse_localized_numbers(df['latitude'], *LATITUDE_RANGE)
+    df['longitude'] = parse_localized_numbers(df['longitude'], *LONGITUDE_RANGE)
+    df['observation_date'] = pd.to_datetime(df['observation_date'], format='ISO8601', errors='coerce')
+    for name in CODE_COLUMNS:
+        codes = pd.to_numeric(df[name], errors='coerce')
+        df[name] = codes.where((codes % 1 == 0) & codes.between(*CODE_RANGE))
+    return df
+
+
+def repair_shifted_rows(df):
+    """Corrige las filas corridas por una coma sin comillas en el municipio.
+
+    El export del IDEAM trae el municipio 'BOGOTA, D.C' sin comillas: esas
+    filas tienen un campo de más, que pandas deja en una columna sin nombre,
+    y todas las columnas desde la zona hidrográfica quedan corridas una
+    posición (la latitud en la zona, la longitud en la latitud...). Se
+    vuelven a su lugar; el municipio conserva la parte antes de la coma, que
+    es como se ha buscado siempre.
+    """
+    extra = [name for name in df.columns if str(name).startswith('Unnamed')]
+    if not extra:
+        return df
+    shifted = df[extra[0]].notna().to_numpy(dtype=bool)
+    if shifted.any():
+        df = df.copy()
+        tail = [*list(CSV_COLUMNS)[list(CSV_COLUMNS).index('zonahidrografica'):], extra[0]]
+        if all(name in df.columns for name in tail):
+            df.loc[shifted, tail[:-1]] = df.loc[shifted, tail[1:]].to_numpy()
+    return df.drop(columns=extra)
+
+
+def _fill_defaults(df):
+    df = df.fillna(DEFAULTS)
+    for name in CODE_COLUMNS:
+        df[name] = df[name].astype(NUMERIC_COLUMNS[name])
+    return df
+
+
+def clean_wind_frame(df, drop_missing_values=False):
+    """Selecciona, renombra y limpia las columnas de un DataFrame del CSV de viento.
+
+    Las coordenadas y el valor observado se convierten a float, la fecha a
+    datetime64 y los códigos a enteros compactos. Con `drop_missing_values`
+    se descartan las filas sin un valor observado numérico en lugar de
+    reemplazarlo por el valor por defecto.
+    """
+    df = parse_wind_frame(repair_shifted_rows(df))
+    if drop_missing_values:
+        df = df.dropna(subset=['observed_value'])
+    return _fill_defaults(df)
+
+
+def validate_wind_frame(df, max_errors=10, first_row=0):
+    """Valida un lote de observaciones nuevas.
+
+    Rechaza las filas sin código de estación o valor observado numérico, las
+    que traen códigos que no son enteros de 32 bits, y las que traen
+    coordenadas, velocidad o fecha que no se pueden leer o quedan fuera de
+    su rango válido. Devuelve el lote
+    limpio con las filas aceptadas, el número de filas rechazadas y los
+    primeros `max_errors` errores (con el número de fila contando desde
+    `first_row`).
+    """
+    raw = repair_shifted_rows(df).rename(columns=CSV_COLUMNS).reindex(columns=list(COLUMNS))
+    parsed = parse_wind_frame(raw)
+    problems = {
+        'station_code': parsed['station_code'].isna(),
+        'sensor_code': raw['sensor_code'].notna() & parsed['sensor_code'].isna(),
+        'observed_value': parsed['observed_value'].isna(),
+        'latitude': raw['latitude'].notna() & parsed['latitude'].isna(),
+        'longitude': raw['longitude'].notna() & parsed['longitude'].isna(),
+        'observation_date': raw['observation_date'].notna() & parsed['observation_date'].isna(),
+    }
+    rejected = np.zeros(len(parsed), dtype=bool)
+    for mask in problems.values():
+        rejected |= mask.to_numpy(dtype=bool)
+
+    errors = []
+    for position in np.flatnonzero(rejected)[:max_errors].tolist():
+        invalid = [name for name, mask in problems.items() if mask.iat[position]]
+        errors.append({'row': first_row + position, 'invalid': invalid})
+    return _fill_defaults(parsed[~rejected]), int(rejected.sum()), errors
+
+
+
+class InvalidWindRecord(ValueError):
+    """Observación suelta con campos que no se pueden leer o quedan fuera de rango."""
+
+    def __init__(self, invalid):
+        super().__init__(f"Campos inválidos: {', '.join(invalid)}")
+        self.invalid = invalid
+
+
+def validate_wind_record(record):
+    """Valida una observación suelta con las mismas reglas que la carga masiva.
+
+    Devuelve un DataFrame de una fila ya limpio; si algún campo es inválido
+    lanza `InvalidWindRecord` con sus nombres, en lugar de guardar el valor
+    por defecto.
+    """
+    valid, rejected, errors = validate_wind_frame(pd.DataFrame([record]), max_errors=1)
+    if rejected:
+        raise InvalidWindRecord(errors[0]['invalid'])
+    return valid
+
+
+def print_progress(rows, bytes_read, total_bytes):
+    """Reporta el avance de la carga del CSV."""
+    if total_bytes:
+        print(f"Cargadas {rows} filas ({bytes_read / total_bytes:.0%} del archivo)")
+    else:
+        print(f"Cargadas {rows} filas")
+
+
+class _LineCounter:
+    """Envuelve un archivo binario y cuenta los saltos de línea que se leen.
+
+    `pd.read_csv` con `on_bad_lines='skip'` no dice cuántas líneas omitió;
+    comparando las líneas leídas con las filas obtenidas se estiman.
+    """
+
+    def __init__(self, handle):
+        self._handle = handle
+        self.lines = 0
+        self._last = b'\n'
+
+    def _count(self, data):
+        if data:
+            self.lines += data.count(b'\n')
+            self._last = data[-1:]
+        return data
+
+    def read(self, size=-1):
+        return self._count(self._handle.read(size))
+
+    def readline(self, size=-1):
+        return self._count(self._handle.readline(size))
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def tell(self):
+        return self._handle.tell()
+
+    def total_lines(self):
+        """Líneas leídas, contando la última aunque no termine en salto de línea."""
+        return self.lines + (self._last != b'\n')
+
+
+def iter_wind_chunks(path, chunksize=CHUNK_SIZE, drop_missing_values=False):
+    """Lee el CSV de viento por lotes de `chunksize` filas ya limpios.
+
+    Devuelve pares (lote, bytes leídos) para poder reportar el avance.
+    """
+    parsed = 0
+    with open(path, 'rb') as handle:
+        counter = _LineCounter(handle)
+        reader = pd.read_csv(
+            counter,
+            chunksize=chunksize,
+            dtype=CSV_DTYPES,
+            # Las columnas sin nombre guardan el campo de más de las filas corridas
+            usecols=lambda name: name in CSV_COLUMNS or name.startswith('Unnamed'),
+            on_bad_lines='skip',
+        )
+        for chunk in reader:
+            parsed += len(chunk)
+            yield clean_wind_frame(chunk, drop_missing_values), counter.tell()
+        # La primera línea es el encabezado; las líneas en blanco también cuentan como omitidas
+        ROWS_SKIPPED.labels('csv').inc(max(counter.total_lines() - 1 - parsed, 0))
+
+
+def load_wind_csv(path, store=None, chunksize=CHUNK_SIZE, drop_missing_values=False, progress=print_progress):
+    """Carga el CSV de viento por lotes en un `WindStore`.
+
+    Cada lote se limpia y se agrega al almacén antes de leer el siguiente, de
+    modo que la memoria usada no depende del tamaño del archivo sino del
+    tamaño del lote y de las columnas ya almacenadas.
+    """
+    store = WindStore() if store is None else store
+    total_bytes = os.path.getsize(path)
+    with span('wind_load_csv'):
+        for chunk, bytes_read in iter_wind_chunks(path, chunksize, drop_missing_values):
+            store.extend(chunk)
+            ROWS_LOADED.labels('csv').inc(len(chunk))
+            if progress is not None:
+                progress(len(store), bytes_read, total_bytes)
+    return store
+
+
+# Tipos de contenido aceptados en la carga masiva de observaciones
+BULK_CONTENT_TYPES = (
+    'text/csv',
+    'application/x-ndjson',
+    'application/jsonl',
+    'application/json',
+    'application/vnd.apache.parquet',
+    'application/x-parquet',
+)
+
+
+def read_bulk_frames(handle, content_type, chunksize=CHUNK_SIZE):
+    """Lee por lotes un archivo de observaciones subido a la API.
+
+    Acepta CSV, NDJSON, un arreglo JSON o Parquet (este último requiere
+    pyarrow o fastparquet).
+    """
+    if content_type == 'text/csv':
+        yield from pd.read_csv(handle, chunksize=chunksize, dtype=CSV_DTYPES, on_bad_lines='skip')
+    elif content_type in ('application/x-ndjson', 'application/jsonl'):
+        yield from pd.read_json(handle, lines=True, chunksize=chunksize, dtype=False)
+    elif content_type in ('application/vnd.apache.parquet', 'application/x-parquet'):
+        yield pd.read_parquet(handle)
+    elif content_type == 'application/json':
+        records = json.load(handle)
+        if isinstance(records, dict):
+            records = records.get('observations', [])
+        if not isinstance(records, list):
+            raise ValueError("Se esperaba una lista de observaciones")
+        for start in range(0, len(records), chunksize):
+            yield pd.DataFrame(records[start:start + chunksize])
+    else:
+        raise ValueError(f"Tipo de contenido no soportado: {content_type}")
+
+
+def ingest_frames(store, frames, max_errors=10):
+    """Valida y agrega al almacén varios lotes de observaciones.
+
+    Cada lote se agrega de una vez, con el candado de escritura del almacén,
+    actualizando índices y agregados; la lectura y validación del siguiente
+    lote ocurren fuera del candado. Devuelve un resumen con filas aceptadas, rechazadas y los primeros errores.
+    """
+    accepted, rejected, errors = 0, 0, []
+    for frame in frames:
+        valid, rejected_rows, frame_errors = validate_wind_frame(frame, max_errors - len(errors), accepted + rejected)
+        store.extend(valid)
+        ROWS_LOADED.labels('api').inc(len(valid))
+        accepted += len(valid)
+        rejected += rejected_rows
+        errors.extend(frame_errors)
+    return {'accepted': accepted, 'rejected': rejected, 'errors': errors}
+
+
+class _ReadWriteLock:
+    """Candado de varios lectores o un solo escritor.
+
+    Las escrituras esperan a que terminen las lecturas en curso y tienen
+    prioridad sobre las lecturas nuevas. Es reentrante por hilo: una lectura
+    puede anidar otras, y el hilo que escribe puede leer (los suscriptores
+    consultan el almacén cuando se les notifica un cambio) o volver a
+    escribir. Un hilo que está leyendo no puede pasar a escribir.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def reading(self):
+        depth = getattr(self._local, 'depth', 0)
+        if depth or self._writer == threading.get_ident():
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def writing(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer != me:
+                if getattr(self._local, 'depth', 0):
+                    raise RuntimeError("No se puede modificar el almacén mientras se lee")
+                self._waiting_writers += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._condition.wait()
+                finally:
+                    self._waiting_writers -= 1
+                self._writer = me
+            self._writer_depth += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer_depth -= 1
+                if not self._writer_depth:
+                    self._writer = None
+                    self._condition.notify_all()
+
+
+def _reads(method):
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock.reading():
+            return method(self, *args, **kwargs)
+    return locked
+
+
+def _writes(method):
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock.writing():
+            return method(self, *args, **kwargs)
+    return locked
+
+
+class _RowIndex:
+    """Índice hash clave -> ids de fila.
+
+    Cada clave guarda una lista de bloques de ids ordenados; los bloques se
+    consolidan en un solo arreglo la primera vez que se consulta la clave.
+    """
+
+    def __init__(self):
+        self._parts = {}
+
+    def __contains__(self, key):
+        return key in self._parts
+
+    def __iter__(self):
+        return iter(self._parts)
+
+    def extend(self, keys, row_ids):
+        """Agrega al índice las filas `row_ids` con sus claves `keys`."""
+        if len(keys) == 0:
+            return
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        unique_keys, starts = np.unique(sorted_keys, return_index=True)
+        for key, block in zip(unique_keys.tolist(), np.split(row_ids[order], starts[1:])):
+            self._parts.setdefault(key, []).append(block)
+
+    def add(self, key, row_id):
+        self._parts.setdefault(key, []).append(np.array([row_id], dtype=np.int64))
+
+    def remove(self, key, row_id):
+        rows = self.get(key)
+        rows = rows[rows != row_id]
+        if len(rows):
+            self._parts[key] = [rows]
+        else:
+            self._parts.pop(key, None)
+
+    def pop(self, key):
+        rows = self.get(key)
+        self._parts.pop(key, None)
+        return rows
+
+    def get(self, key):
+        parts = self._parts.get(key)
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        if len(parts) > 1:
+            # Los bloques se agregan en orden creciente de fila, salvo las
+            # reasignaciones por actualización; se reordena al consolidar
+            merged = np.sort(np.concatenate(parts))
+            self._parts[key] = [merged]
+            return merged
+        return parts[0]
+
+    def to_csr(self):
+        """Exporta el índice como claves, desplazamientos y filas concatenadas."""
+        keys = sorted(self._parts)
+        blocks = [self.get(key) for key in keys]
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(block) for block in blocks])
+        rows = np.concatenate(blocks) if blocks else np.empty(0, dtype=np.int64)
+        return np.asarray(keys, dtype=np.int64), offsets, rows
+
+    @classmethod
+    def from_csr(cls, keys, offsets, rows):
+        """Reconstruye el índice; cada clave queda como una vista sobre `rows`."""
+        index = cls()
+        for key, start, end in zip(keys.tolist(), offsets[:-1].tolist(), offsets[1:].tolist()):
+            index._parts[key] = [rows[start:end]]
+        return index
+
+
+class _GroupStats:
+    """Agregados por grupo: conteo por clase de viento, suma, mínimo, máximo y muestras.
+
+    Los grupos se identifican por la clave del índice correspondiente y cada
+    uno ocupa una posición en arreglos de NumPy, de modo que agregar o quitar
+    un lote de valores son operaciones vectorizadas.
+    """
+
+    def __init__(self):
+        self._positions = {}
+        self.counts = np.zeros((0, len(WIND_CLASSES)), dtype=np.int64)
+        self.total = np.zeros(0, dtype=np.float64)
+        self.minimum = np.zeros(0, dtype=np.float64)
+        self.maximum = np.zeros(0, dtype=np.float64)
+        self.samples = np.zeros(0, dtype=np.int64)
+
+    def _group_positions(self, keys):
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        positions = np.empty(len(unique_keys), dtype=np.int64)
+        for i, key in enumerate(unique_keys.tolist()):
+            position = self._positions.get(key)
+            if position is None:
+                position = self._positions[key] = len(self._positions)
+            positions[i] = position
+        self._grow(len(self._positions))
+        return positions[inverse]
+
+    def _grow(self, size):
+        missing = size - len(self.total)
+        if missing <= 0:
+            return
+        self.counts = np.vstack([self.counts, np.zeros((missing, len(WIND_CLASSES)), dtype=np.int64)])
+        self.total = np.concatenate([self.total, np.zeros(missing)])
+        self.minimum = np.concatenate([self.minimum, np.full(missing, np.inf)])
+        self.maximum = np.concatenate([self.maximum, np.full(missing, -np.inf)])
+        self.samples = np.concatenate([self.samples, np.zeros(missing, dtype=np.int64)])
+
+    def add(self, keys, values):
+        """Suma un lote de valores a los grupos de sus claves."""
+        if len(keys) == 0:
+            return
+        positions = self._group_positions(keys)
+        np.add.at(self.counts, (positions, classify_wind_codes(values)), 1)
+        np.add.at(self.total, positions, values)
+        np.add.at(self.samples, positions, 1)
+        np.minimum.at(self.minimum, positions, values)
+        np.maximum.at(self.maximum, positions, values)
+
+    def remove(self, keys, values):
+        """Resta un lote de valores; devuelve las claves cuyo mínimo o máximo hay que recalcular."""
+        if len(keys) == 0:
+            return []
+        positions = self._group_positions(keys)
+        np.subtract.at(self.counts, (positions, classify_wind_codes(values)), 1)
+        np.subtract.at(self.total, positions, values)
+        np.subtract.at(self.samples, positions, 1)
+        return np.unique(keys).tolist()
+
+    def to_arrays(self):
+        return {
+            'keys': np.asarray(list(self._positions), dtype=np.int64),
+            'counts': self.counts,
+            'total': self.total,
+            'minimum': self.minimum,
+            'maximum': self.maximum,
+            'samples': self.samples,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        stats = cls()
+        stats._positions = {key: position for position, key in enumerate(arrays['keys'].tolist())}
+        for name in ('counts', 'total', 'minimum', 'maximum', 'samples'):
+            setattr(stats, name, np.array(arrays[name]))
+        return stats
+
+    def reset_extremes(self, key, values):
+        position = self._positions[key]
+        self.minimum[position] = values.min() if len(values) else np.inf
+        self.maximum[position] = values.max() if len(values) else -np.inf
+
+    def summary(self, keys):
+        """Combina los agregados de varias claves; None si no hay muestras."""
+        positions = [self._positions[key] for key in keys if key in self._positions]
+        samples = int(self.samples[positions].sum())
+        if not samples:
+            return None
+        counts = self.counts[positions].sum(axis=0)
+        return {
+            'counts': dict(zip(WIND_CLASSES, counts.tolist())),
+            'mean': float(self.total[positions].sum() / samples),
+            'min': float(self.minimum[positions].min()),
+            'max': float(self.maximum[positions].max()),
+            'samples': samples,
+        }
+
+
+class WindStore:
+    """Almacén columnar en memoria para las observaciones de viento.
+
+    Las columnas numéricas se guardan en arreglos de NumPy, las de texto como
+    códigos enteros sobre una tabla de categorías, y se mantienen índices hash
+    por estación, municipio y zona hidrográfica.
+
+    Los borrados solo marcan las filas como eliminadas; las columnas se
+    compactan cuando las filas borradas superan `COMPACTION_RATIO`. La
+    compactación cambia los ids de fila, así que cada fila lleva además un
+    número de secuencia que no cambia y crece con el orden de inserción.
+
+    Las mutaciones y la compactación toman el candado de escritura y cada
+    consulta el de lectura. Una lectura compuesta (buscar filas y luego leer
+    sus columnas) debe hacerse dentro de `reading()`, para que una
+    compactación no cambie los ids de fila entre un paso y otro.
+    """
+
+    def __init__(self):
+        self._lock = _ReadWriteLock()
+        self._size = 0
+        self._capacity = 0
+        self._columns = {}
+        for name, dtype in NUMERIC_COLUMNS.items():
+            self._columns[name] = np.empty(0, dtype=dtype)
+        for name in CATEGORY_COLUMNS:
+            self._columns[name] = np.empty(0, dtype=np.int32)
+        # Marca de filas vivas (False = borrada, pendiente de compactar)
+        self._alive = np.empty(0, dtype=bool)
+        self._deleted = 0
+        # Número de secuencia de cada fila (ver `first_row_after`)
+        self._sequence = np.empty(0, dtype=np.int64)
+        self._next_sequence = 0
+
+        # Tablas de categorías: código -> valor y valor -> código
+        self._categories = {name: [] for name in CATEGORY_COLUMNS}
+        self._category_arrays = {name: np.empty(0, dtype=object) for name in CATEGORY_COLUMNS}
+        self._category_codes = {name: {} for name in CATEGORY_COLUMNS}
+        # Nombre normalizado -> códigos de categoría con ese nombre
+        self._normalized = {name: {} for name in CATEGORY_COLUMNS}
+
+        # Índices clave -> filas y agregados por estación, municipio y zona
+        self._indexes = {name: _RowIndex() for name in INDEXED_COLUMNS}
+        self._stats = {name: _GroupStats() for name in INDEXED_COLUMNS}
+        # Grupos cuyo mínimo y máximo hay que recalcular antes de consultarlos
+        self._stale_extremes = {name: set() for name in INDEXED_COLUMNS}
+        self._listeners = []
+        # Aumenta con cada mutación; identifica el estado de los datos
+        self.version = 0
+
+    def __len__(self):
+        return self._size - self._deleted
+
+    @classmethod
+    def from_frame(cls, df):
+        store = cls()
+        store.extend(df)
+        return store
+
+    # ------------------------------------------------------------------
+    # Carga y mutaciones
+    # ------------------------------------------------------------------
+
+    def reading(self):
+        """Contexto de lectura: el almacén no cambia mientras dura."""
+        return self._lock.reading()
+
+    def writing(self):
+        """Contexto de escritura, para agrupar varias mutaciones y sus lecturas."""
+        return self._lock.writing()
+
+    def add_listener(self, listener):
+        """Registra `listener(store, change)`, llamado después de cada mutación."""
+        self._listeners.append(listener)
+
+    def _notify(self, action, rows, keys):
+        if not self._listeners:
+            return
+        change = WindChange(action, rows, keys)
+        for listener in self._listeners:
+            listener(self, change)
+
+    def _row_keys(self, rows):
+        return {name: set(np.unique(self._columns[name][rows]).tolist()) for name in INDEXED_COLUMNS}
+
+    def _ensure_capacity(self, extra):
+        needed = self._size + extra
+        if needed <= self._capacity:
+            return
+        capacity = max(needed, self._capacity * 2, 1024)
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._alive = alive
+        sequence = np.empty(capacity, dtype=np.int64)
+        sequence[:self._size] = self._sequence[:self._size]
+        self._sequence = sequence
+        self._capacity = capacity
+
+    def _category_code(self, name, value, refresh=True):
+        codes = self._category_codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = len(self._categories[name])
+            codes[value] = code
+            self._categories[name].append(value)
+            self._normalized[name].setdefault(normalize_name(value), set()).add(code)
+            if refresh:
+                self._category_arrays[name] = np.asarray(self._categories[name], dtype=object)
+        return code
+
+    def _encode_categories(self, name, values):
+        known = len(self._categories[name])
+        for value in pd.unique(values):
+            self._category_code(name, value, refresh=False)
+        if len(self._categories[name]) != known:
+            self._category_arrays[name] = np.asarray(self._categories[name], dtype=object)
+        return pd.Series(values).map(self._category_codes[name]).to_numpy(dtype=np.int32)
+
+    @_writes
+    def extend(self, df):
+        """Agrega un DataFrame ya limpio (ver `clean_wind_frame`) al almacén."""
+        count = len(df)
+        if count == 0:
+            return np.empty(0, dtype=np.int64)
+        self._ensure_capacity(count)
+        start, end = self._size, self._size + count
+
+        for name, dtype in NUMERIC_COLUMNS.items():
+            self._columns[name][start:end] = df[name].to_numpy(dtype=dtype)
+        for name in CATEGORY_COLUMNS:
+            self._columns[name][start:end] = self._encode_categories(name, df[name].to_numpy(dtype=object))
+        self._alive[start:end] = True
+        self._sequence[start:end] = np.arange(self._next_sequence, self._next_sequence + count, dtype=np.int64)
+        self._next_sequence += count
+        self._size = end
+        self.version += 1
+
+        row_ids = np.arange(start, end, dtype=np.int64)
+        values = self._columns['observed_value'][start:end]
+        with span('wind_index_extend'):
+            for name in INDEXED_COLUMNS:
+                keys = self._columns[name][start:end]
+                self._indexes[name].extend(keys, row_ids)
+                self._stats[name].add(keys, values)
+        if self._listeners:
+            self._notify('insert', row_ids, self._row_keys(row_ids))
+        return row_ids
+
+    @_writes
+    def append(self, record):
+        """Agrega una observación y devuelve su id de fila.
+
+        Lanza `InvalidWindRecord` si la observación no pasa la validación.
+        """
+        return int(self.extend(validate_wind_record(record))[0])
+
+    @_writes
+    def update_row(self, row_id, values):
+        """Actualiza en su lugar una fila, moviéndola de índice si cambia su clave.
+
+        Los valores se validan como en la carga masiva; si alguno es inválido
+        se lanza `InvalidWindRecord` y la fila no cambia.
+        """
+        # Los campos obligatorios que no se actualizan conservan su valor actual
+        current = {name: self._columns[name][row_id] for name in ('station_code', 'observed_value')}
+        cleaned = validate_wind_record({**current, **values}).iloc[0]
+
+        old_keys = {name: self._columns[name][row_id:row_id + 1].copy() for name in INDEXED_COLUMNS}
+        old_value = self._columns['observed_value'][row_id:row_id + 1].copy()
+        for name in values:
+            if name in NUMERIC_COLUMNS:
+                self._columns[name][row_id] = cleaned[name]
+            elif name in CATEGORY_COLUMNS:
+                self._columns[name][row_id] = self._category_code(name, cleaned[name])
+
+        new_value = self._columns['observed_value'][row_id:row_id + 1]
+        for name in INDEXED_COLUMNS:
+            old_key = int(old_keys[name][0])
+            new_key = int(self._columns[name][row_id])
+            if new_key != old_key:
+                self._indexes[name].remove(old_key, row_id)
+                self._indexes[name].add(new_key, row_id)
+            # Se quita el valor anterior del grupo viejo y se suma el nuevo
+            stale = self._stats[name].remove(old_keys[name], old_value)
+            self._stats[name].add(self._columns[name][row_id:row_id + 1], new_value)
+            self._stale_extremes[name].update(stale)
+        self.version += 1
+        self._notify('update', np.array([row_id], dtype=np.int64), {
+            name: {int(old_keys[name][0]), int(self._columns[name][row_id])} for name in INDEXED_COLUMNS})
+
+    @_writes
+    def update_station(self, station_code, values):
+        """Actualiza en su lugar la primera fila de una estación; devuelve su id o None."""
+        rows = self.station_rows(station_code)
+        if not len(rows):
+            return None
+        row_id = int(rows[0])
+        self.update_row(row_id, values)
+        return row_id
+
+    def _refresh_extremes(self, name, keys):
+        # El mínimo y el máximo no se pueden restar: se recalculan, al
+        # consultarlos, con las filas vivas que le quedan al grupo
+        stale = self._stale_extremes[name]
+        for key in stale.intersection(keys):
+            rows = self._live(self._indexes[name].get(key))
+            self._stats[name].reset_extremes(key, self._columns['observed_value'][rows])
+            stale.discard(key)
+
+    @_writes
+    def delete_station(self, station_code):
+        """Borra todas las filas de una estación y devuelve cuántas se borraron.
+
+        Las filas se marcan como borradas y se descuentan de los agregados en
+        O(k) sobre las filas de la estación, sin copiar el resto de los datos.
+        """
+        rows = self._indexes['station_code'].pop(station_code)
+        if len(rows) == 0:
+            return 0
+        values = self._columns['observed_value'][rows]
+        for name in INDEXED_COLUMNS:
+            self._stale_extremes[name].update(self._stats[name].remove(self._columns[name][rows], values))
+
+        self._alive[rows] = False
+        self._deleted += len(rows)
+        self.version += 1
+        if self._listeners:
+            self._notify('delete', rows, self._row_keys(rows))
+        if self._deleted > COMPACTION_RATIO * self._size:
+            self.compact()
+        return len(rows)
+
+    @_writes
+    def compact(self):
+        """Elimina físicamente las filas borradas y reconstruye los índices."""
+        if not self._deleted:
+            return
+        keep = self._alive[:self._size]
+        for name, column in self._columns.items():
+            self._columns[name] = column[:self._size][keep]
+        self._sequence = self._sequence[:self._size][keep]
+        self._size = self._capacity = int(keep.sum())
+        self._alive = np.ones(self._size, dtype=bool)
+        self._deleted = 0
+        self._rebuild_indexes()
+
+    def _rebuild_indexes(self):
+        row_ids = np.arange(self._size, dtype=np.int64)
+        for name in INDEXED_COLUMNS:
+            self._indexes[name] = _RowIndex()
+            self._indexes[name].extend(self._columns[name][:self._size], row_ids)
+
+    # ------------------------------------------------------------------
+    # Exportación para las instantáneas en disco (ver snapshot_viento.py)
+    # ------------------------------------------------------------------
+
+    @_writes
+    def export_state(self):
+        """Devuelve los arreglos y metadatos del almacén ya compactado."""
+        self.compact()
+        for name in INDEXED_COLUMNS:
+            self._refresh_extremes(name, list(self._stale_extremes[name]))
+
+        arrays = {f'column.{name}': column[:self._size] for name, column in self._columns.items()}
+        arrays['sequence'] = self._sequence[:self._size]
+        for name in INDEXED_COLUMNS:
+            keys, offsets, rows = self._indexes[name].to_csr()
+            arrays[f'index.{name}.keys'] = keys
+            arrays[f'index.{name}.offsets'] = offsets
+            arrays[f'index.{name}.rows'] = rows
+            for field, values in self._stats[name].to_arrays().items():
+                arrays[f'stats.{name}.{field}'] = values
+        metadata = {'size': self._size, 'next_sequence': self._next_sequence, 'categories': self._categories}
+        return arrays, metadata
+
+    @classmethod
+    def from_state(cls, arrays, metadata):
+        """Reconstruye un almacén sin copiar las columnas ni los índices.
+
+        Los arreglos pueden venir mapeados en memoria desde disco; se copian
+        solo cuando una mutación los modifica o hace crecer el almacén.
+        """
+        store = cls()
+        store._size = store._capacity = metadata['size']
+        for name in store._columns:
+            store._columns[name] = arrays[f'column.{name}']
+        store._alive = np.ones(store._size, dtype=bool)
+        store._sequence = arrays['sequence']
+        store._next_sequence = metadata['next_sequence']
+
+        for name, values in metadata['categories'].items():
+            store._categories[name] = list(values)
+            store._category_arrays[name] = np.asarray(values, dtype=object)
+            store._category_codes[name] = {value: code for code, value in enumerate(values)}
+            normalized = store._normalized[name]
+            for code, value in enumerate(values):
+                normalized.setdefault(normalize_name(value), set()).add(code)
+
+        for name in INDEXED_COLUMNS:
+            store._indexes[name] = _RowIndex.from_csr(
+                arrays[f'index.{name}.keys'], arrays[f'index.{name}.offsets'], arrays[f'index.{name}.rows'])
+            prefix = f'stats.{name}.'
+            store._stats[name] = _GroupStats.from_arrays(
+                {key[len(prefix):]: value for key, value in arrays.items() if key.startswith(prefix)})
+        return store
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def _live(self, rows):
+        # Los índices por municipio y zona pueden conservar filas borradas
+        # hasta la siguiente compactación; se filtran al leer
+        if self._deleted:
+            return rows[self._alive[rows]]
+        return rows
+
+    @_reads
+    def all_rows(self):
+        if self._deleted:
+            return np.flatnonzero(self._alive[:self._size])
+        return np.arange(self._size, dtype=np.int64)
+
+    @_reads
+    def sequence(self, rows):
+        """Números de secuencia de las filas; no cambian al compactar."""
+        return self._sequence[rows]
+
+    @_reads
+    def first_row_after(self, sequence):
+        """Id de la primera fila con número de secuencia mayor que `sequence`."""
+        return int(np.searchsorted(self._sequence[:self._size], sequence, side='right'))
+
+    @_reads
+    def sequence_rows(self, sequences):
+        """Ids de fila actuales de los números de secuencia que siguen vivos."""
+        sequences = np.asarray(sequences, dtype=np.int64)
+        rows = np.searchsorted(self._sequence[:self._size], sequences)
+        found = rows < self._size
+        found[found] = self._sequence[rows[found]] == sequences[found]
+        return self._live(rows[found])
+
+    @_reads
+    def station_codes(self):
+        """Códigos de las estaciones que tienen filas en el almacén."""
+        return list(self._indexes['station_code'])
+
+    @_reads
+    def category_count(self, name):
+        """Valores distintos vistos en una columna de texto; solo crece."""
+        return len(self._categories[name])
+
+    @_reads
+    def station_rows(self, station_code):
+        return self._indexes['station_code'].get(station_code)
+
+    def _matching_codes(self, name, text, exact=False):
+        needle = normalize_name(text)
+        normalized = self._normalized[name]
+        if exact:
+            return sorted(normalized.get(needle, ()))
+        return sorted(code for value, codes in normalized.items() if needle in value for code in codes)
+
+    def _rows_for_codes(self, index, codes):
+        parts = [index.get(code) for code in codes]
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts))
+
+    @_reads
+    def municipality_codes(self, municipality, exact=False):
+        """Códigos de categoría de los municipios que coinciden con `municipality`."""
+        return self._matching_codes('municipality', municipality, exact)
+
+    @_reads
+    def municipality_rows(self, municipality, exact=False):
+        """Filas cuyo municipio contiene (o es igual a) `municipality`, sin distinguir mayúsculas."""
+        codes = self._matching_codes('municipality', municipality, exact)
+        return self._live(self._rows_for_codes(self._indexes['municipality'], codes))
+
+    @_reads
+    def zone_codes(self, zone, exact=False):
+        """Códigos de categoría de las zonas hidrográficas que coinciden con `zone`."""
+        return self._matching_codes('hydrographic_zone', zone, exact)
+
+    @_reads
+    def zone_rows(self, zone, exact=False):
+        """Filas cuya zona hidrográfica contiene (o es igual a) `zone`, sin distinguir mayúsculas."""
+        codes = self._matching_codes('hydrographic_zone', zone, exact)
+        return self._live(self._rows_for_codes(self._indexes['hydrographic_zone'], codes))
+
+    # Los resúmenes devuelven los agregados precalculados (conteo por clase,
+    # promedio, mínimo, máximo y muestras) o None si no hay datos
+
+    def _summary(self, name, keys):
+        self._refresh_extremes(name, keys)
+        return self._stats[name].summary(keys)
+
+    @_reads
+    def station_summary(self, station_code):
+        return self._summary('station_code', [station_code])
+
+    @_reads
+    def municipality_summary(self, municipality, exact=False):
+        return self._summary('municipality', self._matching_codes('municipality', municipality, exact))
+
+    @_reads
+    def zone_summary(self, zone, exact=False):
+        return self._summary('hydrographic_zone', self._matching_codes('hydrographic_zone', zone, exact))
+
+    def _group_means(self, name, key_groups):
+        # Promedio de varios grupos a la vez; cada elemento de `key_groups` es
+        # la lista de claves que se combinan en un mismo resultado
+        stats = self._stats[name]
+        owners, positions = [], []
+        for owner, keys in enumerate(key_groups):
+            for key in keys:
+                position = stats._positions.get(key)
+                if position is not None:
+                    owners.append(owner)
+                    positions.append(position)
+        owners = np.asarray(owners, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.int64)
+        total = np.bincount(owners, weights=stats.total[positions], minlength=len(key_groups))
+        samples = np.bincount(owners, weights=stats.samples[positions], minlength=len(key_groups))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(samples > 0, total / samples, np.nan)
+
+    @_reads
+    def municipality_means(self, municipalities=None):
+        """Velocidad promedio por municipio (comparación exacta sin mayúsculas).
+
+        Sin `municipalities` se calcula para todos los municipios. Devuelve los
+        nombres y un arreglo de promedios, con NaN para los que no tienen datos.
+        """
+        normalized = self._normalized['municipality']
+        if municipalities is None:
+            key_groups = list(normalized.values())
+            municipalities = [self._categories['municipality'][min(codes)] for codes in key_groups]
+        else:
+            key_groups = [normalized.get(normalize_name(name), ()) for name in municipalities]
+        return list(municipalities), self._group_means('municipality', key_groups)
+
+    @_reads
+    def station_means(self, station_codes=None):
+        """Velocidad promedio por estación; sin `station_codes`, para todas."""
+        if station_codes is None:
+            station_codes = self.station_codes()
+        return list(station_codes), self._group_means('station_code', [[code] for code in station_codes])
+
+    @_reads
+    def column(self, name, rows=None):
+        """Valores de una columna; las columnas categóricas se decodifican.
+
+        Sin `rows` se devuelven solo las filas vivas.
+        """
+        column = self._columns[name][:self._size]
+        if rows is not None:
+            column = column[rows]
+        elif self._deleted:
+            column = column[self._alive[:self._size]]
+        if name in CATEGORY_COLUMNS:
+            return self._category_arrays[name][column]
+        return column
+
+    @_reads
+    def json_values(self, name, rows):
+        values = self.column(name, rows)
+        if values.dtype.kind == 'M':
+            # Fechas en el mismo formato ISO del CSV; NaT se devuelve vacío
+            text = np.datetime_as_string(values, unit='ms')
+            return np.where(np.isnat(values), '', text).tolist()
+        return values.tolist()
+
+    @_reads
+    def records(self, rows, fields=None):
+        """Construye la lista de diccionarios para las filas indicadas."""
+        fields = list(fields or COLUMNS)
+        values = [self.json_values(name, rows) for name in fields]
+        return [dict(zip(fields, row)) for row in zip(*values)]
@@ -0,0 +1,93 @@
+from collections import namedtuple
+
+# Un paso del diálogo: la clave donde se guarda la respuesta en `usuario_info`,
+# la función que valida y convierte el mensaje, y la respuesta que se envía
+# cuando el mensaje es válido. La respuesta es una plantilla (se formatea con
+# `valor`) o una función que recibe (usuario_info, palabra_count).
+Paso = namedtuple('Paso', ['clave', 'validar', 'respuesta'])
+
+
+class RespuestaInvalida(ValueError):
+    """El mensaje no sirve para el paso actual; se repite la pregunta con este texto."""
+
+
+def _fuera_de_rango(valor, minimo, maximo):
+    # Escrito con `not` para que NaN también quede fuera de rango
+    return (minimo is not None and not valor >= minimo) or (maximo is not None and not valor <= maximo)
+
+
+def texto(mensaje):
+    return mensaje
+
+
+def numero(tipo, error_formato, minimo=None, maximo=None, error_rango=None):
+    """Validador de un número de `tipo` (int o float), opcionalmente en [minimo, maximo]."""
+    def validar(mensaje):
+        try:
+            valor = tipo(mensaje)
+        except ValueError:
+            raise RespuestaInvalida(error_formato)
+        if _fuera_de_rango(valor, minimo, maximo):
+            raise RespuestaInvalida(error_rango)
+        return valor
+    return validar
+
+
+def lista_numeros(nombres, error_formato, error_cantidad, minimo=None, maximo=None, error_rango=None):
+    """Validador de números separados por comas, uno por cada nombre, en orden.
+
+    Con `minimo` o `maximo`, cada número debe quedar en [minimo, maximo].
+    """
+    def validar(mensaje):
+        try:
+            valores = list(map(float, mensaje.split(",")))
+        except ValueError:
+            raise RespuestaInvalida(error_formato)
+        if len(valores) != len(nombres):
+            raise RespuestaInvalida(error_cantidad)
+        if any(_fuera_de_rango(valor, minimo, maximo) for valor in valores):
+            raise RespuestaInvalida(error_rango)
+        return dict(zip(nombres, valores))
+    return validar
+
+
+class Dialogo:
+    """Máquina de estados del chat, definida por una tabla de pasos.
+
+    Cada sesión guarda en `estado['paso']` el índice del paso en que va, así
+    que atender un mensaje es un acceso directo a la tabla sin importar
+    cuántos pasos tenga el diálogo. El paso avanza solo cuando la respuesta
+    se arma sin errores; una respuesta que lanza `RespuestaInvalida` deja la
+    sesión en el mismo paso.
+    """
+
+    def __init__(self, pasos, contar_palabras, respuesta_final):
+        self.pasos = tuple(pasos)
+        self.contar_palabras = contar_palabras
+        self.respuesta_final = respuesta_final
+
+    def responder(self, estado, mensaje):
+        usuario_info = estado['usuario_info']
+        palabra_count = estado['palabra_count']
+        self.contar_palabras(mensaje, palabra_count)
+
+        indice = estado.setdefault('paso', 0)
+        if indice >= len(self.pasos):
+            return self.respuesta_final(usuario_info, palabra_count)
+
+        paso = self.pasos[indice]
+        try:
+            valor = paso.validar(mensaje)
+        except RespuestaInvalida as e:
+            return {"mensaje": str(e)}
+        usuario_info[paso.clave] = valor
+
+        if callable(paso.respuesta):
+            try:
+                respuesta = paso.respuesta(usuario_info, palabra_count)
+            except RespuestaInvalida as e:
+                return {"mensaje": str(e)}
+        else:
+            respuesta = {"mensaje": paso.respuesta.format(valor=valor)}
+        estado['paso'] = indice + 1
+        return respuesta
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from configuracion import load_settings
+from metricas import WORK_PENDING, WORK_REQUESTS
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class WorkPool:
+    """Ejecuta fuera del event loop el trabajo pesado de las rutas async.
+
+    Los filtros grandes, las agregaciones y las predicciones por lotes corren
+    en un número fijo de hilos que comparten el almacén en memoria; NumPy,
+    pandas y scikit-learn sueltan el GIL en sus operaciones sobre arreglos.
+    Cada trabajo busca y lee sus filas con el candado de lectura del almacén
+    (ver `WindStore.reading`), así que las escrituras de otros hilos no lo
+    dejan a medias.
+    Las consultas idénticas que llegan mientras una está en curso (misma
+    `key`) esperan su resultado en lugar de repetirla. Cuando ya hay
+    `max_workers + max_queue` trabajos pendientes se responde 503, y si uno
+    tarda más de `timeout` segundos, 504; el trabajo sigue ocupando su lugar
+    hasta que termina.
+    """
+
+    def __init__(self, max_workers, max_queue, timeout=None):
+        self.max_workers = max_workers
+        self.max_pending = max_workers + max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='trabajo-rutas')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._in_flight = {}
+
+    def submit(self, function, *args, key=None):
+        """Future del trabajo, o el de una llamada en curso con la misma `key`."""
+        with self._lock:
+            future = self._in_flight.get(key) if key is not None else None
+            if future is not None:
+                WORK_REQUESTS.labels('coalesced').inc()
+                return future
+            if self._pending >= self.max_pending:
+                WORK_REQUESTS.labels('rejected').inc()
+                raise HTTPException(
+                    status_code=503,
+                    detail="El servidor está ocupado; intenta de nuevo en unos segundos.",
+                    headers={'Retry-After': '1'},
+                )
+            self._pending += 1
+            WORK_PENDING.set(self._pending)
+            future = self._executor.submit(function, *args)
+            if key is not None:
+                self._in_flight[key] = future
+        WORK_REQUESTS.labels('submitted').inc()
+        future.add_done_callback(lambda done: self._finished(key, done))
+        return future
+
+    def _finished(self, key, future):
+        with self._lock:
+            self._pending -= 1
+            WORK_PENDING.set(self._pending)
+            if key is not None and self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    async def run(self, function, *args, key=None):
+        """Espera el resultado de `function(*args)` sin bloquear el event loop."""
+        return await self.result(self.submit(function, *args, key=key))
+
+    async def result(self, future):
+        """Espera un trabajo ya enviado con `submit`, con el tiempo máximo del pool."""
+        try:
+            # shield: al vencer el tiempo no se cancela el trabajo, que puede
+            # estar compartido con otras peticiones
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+        except asyncio.TimeoutError:
+            WORK_REQUESTS.labels('timeout').inc()
+            raise HTTPException(status_code=504, detail="La consulta tardó demasiado; intenta con un rango más pequeño.")
+
+
+def get_work_pool():
+    """Pool del proceso, compartido por todas las APIs montadas en él."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            settings = load_settings()
+            _pool = WorkPool(settings.work_pool_workers, settings.work_pool_queue, settings.work_timeout_seconds)
+        return _pool
@@ -0,0 +1,45 @@
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse
+
+from configuracion import load_settings
+from contexto_viento import get_wind_context
+from metricas import install_metrics
+
+# Aplicación combinada: monta las APIs habilitadas sobre un solo proceso, con
+# una sola carga de los datos de viento compartida por todas (ver
+# contexto_viento.py). Cada componente se habilita o deshabilita con
+# ENABLE_WIND_API, ENABLE_WIND_CLASSIFIER y ENABLE_CHAT (ver configuracion.py).
+settings = load_settings()
+
+app = FastAPI(
+    title="Energías Limpias",
+    version="1.0.0",
+    description="Datos de viento, clasificación del potencial eólico y chat de consumo de energía."
+)
+
+# Latencia por ruta y métricas internas en /metrics, en formato de Prometheus
+install_metrics(app)
+
+if settings.enable_wind_api:
+    import chat_bot_Reto_2
+    app.include_router(chat_bot_Reto_2.router)
+
+if settings.enable_wind_classifier:
+    import potencial_energia_eolica
+    # El clasificador tiene una ruta con el mismo camino que la API de datos,
+    # así que se monta bajo su propio prefijo
+    app.include_router(potencial_energia_eolica.router, prefix="/classifier")
+
+if settings.enable_chat:
+    import chat_energetico_Reto_3
+    app.include_router(chat_energetico_Reto_3.router)
+    if settings.enable_wind_api or settings.enable_wind_classifier:
+        # El chat menciona la estación de viento más cercana al municipio del usuario
+        chat_energetico_Reto_3.configurar_datos_viento(get_wind_context().station_index)
+else:
+    @app.get("/", tags=["Home"])
+    def home():
+        return HTMLResponse("<h1>Bienvenido a la API de Energías Limpias</h1>")
+
+#para correr la app: uvicorn main:app --reload
+# http://127.0.0.1:8000/docs
@@ -0,0 +1,239 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from fastapi.responses import PlainTextResponse
+
+# Métricas de las APIs en el formato de texto de Prometheus, expuestas en
+# /metrics. Las métricas son del proceso; con varios workers cada uno
+# reporta las suyas y Prometheus las suma.
+
+# Límites (en segundos) de las cubetas de los histogramas de latencia
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Etiqueta de las peticiones que no corresponden a ninguna ruta, para no
+# crear una serie por cada URL desconocida
+UNMATCHED_ROUTE = 'unmatched'
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Value:
+    """Valor de un contador o gauge para una combinación de etiquetas."""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+
+class _Buckets:
+    """Conteos de un histograma para una combinación de etiquetas."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # Sin etiquetas la serie existe desde el inicio, aunque valga cero
+            self.labels()
+        _registry.append(self)
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self, values, child):
+        yield self.name, _format_labels(self.labelnames, values), child.value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in sorted(children):
+            for name, labels, value in self._samples(values, child):
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _samples(self, values, child):
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float('inf')), counts):
+            cumulative += count
+            yield f'{self.name}_bucket', _format_labels(self.labelnames, values, [('le', _format_value(float(bound)))]), cumulative
+        yield f'{self.name}_sum', _format_labels(self.labelnames, values), total
+        yield f'{self.name}_count', _format_labels(self.labelnames, values), cumulative
+
+
+# Métricas de las peticiones HTTP, por método y plantilla de la ruta
+HTTP_REQUESTS = Counter('http_requests_total', 'Peticiones HTTP atendidas', ('method', 'route', 'status'))
+HTTP_LATENCY = Histogram('http_request_duration_seconds', 'Latencia de las peticiones HTTP', ('method', 'route'))
+
+# Operaciones internas: carga, construcción de índices, clasificación, predicción
+SPAN_LATENCY = Histogram('energia_span_duration_seconds', 'Duración de las operaciones instrumentadas', ('span',))
+SPAN_ERRORS = Counter('energia_span_errors_total', 'Operaciones instrumentadas que terminaron con error', ('span',))
+
+ROWS_LOADED = Counter('wind_rows_loaded_total', 'Filas de viento agregadas al almacén', ('source',))
+ROWS_SKIPPED = Counter('wind_rows_skipped_total', 'Líneas del CSV omitidas por mal formadas (estimado)', ('source',))
+LOAD_ERRORS = Counter('wind_load_errors_total', 'Cargas de datos de viento que fallaron')
+
+CACHE_REQUESTS = Counter('energia_cache_requests_total', 'Consultas a las cachés internas', ('cache', 'result'))
+
+MODEL_TRAININGS = Counter('wind_model_trainings_total', 'Entrenamientos del modelo de viento', ('kind', 'result'))
+MODEL_VERSION = Gauge('wind_model_version', 'Versión del modelo de viento activo')
+MODEL_ACCURACY = Gauge('wind_model_accuracy', 'Precisión del modelo activo sobre su conjunto de prueba')
+
+WORK_REQUESTS = Counter('energia_work_requests_total', 'Trabajos enviados al pool de las rutas pesadas', ('result',))
+WORK_PENDING = Gauge('energia_work_pending', 'Trabajos en ejecución o en espera en el pool')
+
+
+@contextmanager
+def span(name):
+    """Mide la duración del bloque en energia_span_duration_seconds{span=name}."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        SPAN_ERRORS.labels(name).inc()
+        raise
+    finally:
+        SPAN_LATENCY.labels(name).observe(time.perf_counter() - started)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def route_template(scope):
+    """Plantilla de la ruta atendida, p. ej. /wind-data/{station_code}."""
+    # Los routers incluidos con prefijo dejan en scope['route'] la ruta sin el
+    # prefijo; FastAPI guarda la ruta completa en su contexto
+    context = scope.get('fastapi', {}).get('effective_route_context')
+    if context is not None:
+        return context.path
+    route = scope.get('route')
+    return getattr(route, 'path', None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que registra la latencia y el estado de cada petición HTTP."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = route_template(scope)
+            HTTP_LATENCY.labels(scope['method'], route).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(scope['method'], route, str(status)).inc()
+
+
+def render():
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
+
+
+def install_metrics(app):
+    """Agrega el middleware de métricas y la ruta /metrics a una aplicación."""
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get('/metrics', tags=['Metrics'], response_class=PlainTextResponse)
+    def metrics():
+        return PlainTextResponse(render(), media_type=CONTENT_TYPE)
+
+    return app
@@ -0,0 +1,225 @@
+import copy
+import json
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from sklearn.naive_bayes import GaussianNB
+
+from datos_viento import WIND_CLASSES, classify_wind_codes
+from metricas import MODEL_ACCURACY, MODEL_TRAININGS, MODEL_VERSION, span
+
+# Todas las clases se declaran desde el primer entrenamiento para que
+# `partial_fit` acepte lotes nuevos con clases que aún no se habían visto
+MODEL_CLASSES = np.arange(len(WIND_CLASSES))
+
+MODEL_FILE = re.compile(r'^naive_bayes_v(\d+)\.pkl$')
+
+# Versiones que se conservan en disco; las anteriores se borran al guardar una nueva
+KEEP_VERSIONS = 5
+
+
+def train_naive_bayes(values):
+    """Entrena un GaussianNB sobre las velocidades y devuelve (modelo, métricas)."""
+    started = time.perf_counter()
+    X = np.asarray(values, dtype=np.float64).reshape(-1, 1)  # Características (velocidad del viento)
+    y = classify_wind_codes(X[:, 0])  # Clases codificadas
+
+    # Dividir los datos en entrenamiento y prueba
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    model = GaussianNB()
+    model.partial_fit(X_train, y_train, classes=MODEL_CLASSES)
+
+    # Evaluar el modelo
+    accuracy = accuracy_score(y_test, model.predict(X_test))
+    return model, {
+        'kind': 'full',
+        'accuracy': float(accuracy),
+        'train_samples': int(len(X_train)),
+        'test_samples': int(len(X_test)),
+        'duration_seconds': time.perf_counter() - started,
+    }
+
+
+class ModelManager:
+    """Ciclo de vida del modelo Naive Bayes de clasificación de viento.
+
+    Los entrenamientos corren en un hilo aparte, fuera del camino de las
+    peticiones. Cada modelo entrenado recibe un número de versión, se guarda
+    en disco y reemplaza al activo de forma atómica; mientras no hay ningún
+    modelo, `model` es None y las rutas usan la clasificación por umbrales.
+    En disco se conservan solo las últimas `keep_versions` versiones.
+    """
+
+    def __init__(self, directory=None, keep_versions=KEEP_VERSIONS):
+        self.directory = directory
+        self.keep_versions = max(keep_versions, 1)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='modelo-viento')
+        # (versión, modelo, métricas) del modelo activo; se reemplaza entero
+        self._active = (0, None, None)
+        self._retrain_pending = False
+        self.last_error = None
+
+    @property
+    def model(self):
+        return self._active[1]
+
+    @property
+    def version(self):
+        return self._active[0]
+
+    def status(self):
+        version, model, metrics = self._active
+        return {
+            'version': version if model is not None else None,
+            'metrics': metrics,
+            'retrain_pending': self._retrain_pending,
+            'last_error': self.last_error,
+        }
+
+    def _saved_versions(self):
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        return sorted(int(match.group(1)) for match in map(MODEL_FILE.match, os.listdir(self.directory)) if match)
+
+    def load_latest(self):
+        """Activa la versión más reciente guardada en disco; devuelve si había alguna."""
+        versions = self._saved_versions()
+        if not versions:
+            return False
+        version = max(versions)
+        base = os.path.join(self.directory, f'naive_bayes_v{version}')
+        with open(base + '.pkl', 'rb') as handle:
+            model = pickle.load(handle)
+        metrics = None
+        if os.path.exists(base + '.json'):
+            with open(base + '.json', encoding='utf-8') as handle:
+                metrics = json.load(handle)
+        self._active = (version, model, metrics)
+        MODEL_VERSION.set(version)
+        if metrics and metrics.get('accuracy') is not None:
+            MODEL_ACCURACY.set(metrics['accuracy'])
+        return True
+
+    def _publish(self, model, metrics):
+        with self._lock:
+            version = self._active[0] + 1
+            metrics = {**metrics, 'version': version, 'trained_at': time.time()}
+            if self.directory:
+                self._save(version, model, metrics)
+            self._active = (version, model, metrics)
+        MODEL_VERSION.set(version)
+        if metrics.get('accuracy') is not None:
+            MODEL_ACCURACY.set(metrics['accuracy'])
+        return version
+
+    def _save(self, version, model, metrics):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f'naive_bayes_v{version}')
+        for suffix, mode, write in (
+            ('.json', 'w', lambda handle: json.dump(metrics, handle)),
+            ('.pkl', 'wb', lambda handle: pickle.dump(model, handle)),
+        ):
+            with tempfile.NamedTemporaryFile(mode, dir=self.directory, delete=False) as handle:
+                write(handle)
+            os.replace(handle.name, base + suffix)
+        self._prune()
+
+    def _prune(self):
+        # Cada inserción publica una versión nueva (partial_fit); sin borrar
+        # las anteriores el directorio crecería sin límite
+        for version in self._saved_versions()[:-self.keep_versions]:
+            base = os.path.join(self.directory, f'naive_bayes_v{version}')
+            for suffix in ('.pkl', '.json'):
+                try:
+                    os.remove(base + suffix)
+                except FileNotFoundError:
+                    pass
+
+    def _run(self, job, kind, *args):
+        try:
+            with span(f'model_train_{kind}'):
+                model, metrics = job(*args)
+            version = self._publish(model, metrics)
+            MODEL_TRAININGS.labels(kind, 'ok').inc()
+            self.last_error = None
+            if metrics['kind'] == 'full':
+                print(f"Modelo v{version} entrenado. Precisión del modelo: {metrics['accuracy']:.2f}")
+        except Exception as e:
+            MODEL_TRAININGS.labels(kind, 'error').inc()
+            self.last_error = str(e)
+            print(f"Error al entrenar el modelo: {e}")
+
+    def train_async(self, store):
+        """Programa un entrenamiento completo; no se encolan dos a la vez.
+
+        Los datos se leen al empezar el entrenamiento, así que uno que ya está
+        en cola incluye los cambios que lleguen mientras espera (ver
+        `on_store_change`).
+        """
+        with self._lock:
+            if self._retrain_pending:
+                return None
+            self._retrain_pending = True
+            return self._executor.submit(self._train_full, store)
+
+    def _train_full(self, store):
+        # La marca se quita y los datos se leen sin que el almacén cambie en
+        # medio: una inserción queda o en este entrenamiento o en un partial_fit
+        with store.reading():
+            with self._lock:
+                self._retrain_pending = False
+            values = store.column('observed_value').copy()
+        self._run(train_naive_bayes, 'full', values)
+
+    def partial_fit_async(self, values):
+        """Actualiza el modelo activo con observaciones nuevas, sin reentrenar todo."""
+        values = np.asarray(values, dtype=np.float64).copy()
+        return self._executor.submit(self._run, self._partial_fit, 'partial', values)
+
+    def _partial_fit(self, values):
+        version, model, metrics = self._active
+        if model is None:
+            raise RuntimeError("No hay un modelo activo para actualizar")
+        # Se actualiza una copia para que las peticiones en curso sigan usando
+        # el modelo activo hasta que la nueva versión se publique
+        updated = copy.deepcopy(model)
+        started = time.perf_counter()
+        updated.partial_fit(values.reshape(-1, 1), classify_wind_codes(values))
+        return updated, {
+            **(metrics or {}),
+            'kind': 'partial',
+            'base_version': version,
+            'partial_samples': int(len(values)),
+            'duration_seconds': time.perf_counter() - started,
+        }
+
+    def on_store_change(self, store, change):
+        """Escucha las mutaciones del almacén de viento.
+
+        Las filas nuevas se incorporan con `partial_fit`; como Naive Bayes no
+        puede olvidar observaciones, las actualizaciones y los borrados
+        programan un reentrenamiento completo. Si hay uno en cola que aún no
+        leyó el almacén, las filas nuevas ya entran en él y no se aplican de
+        nuevo.
+        """
+        if change.action != 'insert' or self.model is None:
+            self.train_async(store)
+            return
+        values = store.column('observed_value', change.rows)
+        with self._lock:
+            if not self._retrain_pending:
+                self.partial_fit_async(values)
+
+    def wait(self, timeout=None):
+        """Espera a que terminen los entrenamientos programados hasta ahora."""
+        self._executor.submit(lambda: None).result(timeout)
@@ -0,0 +1,292 @@
+import math
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from datos_viento import normalize_name
+from metricas import record_cache, span
+
+# Densidad del aire a nivel del mar y 15 °C (kg/m³)
+AIR_DENSITY = 1.225
+
+# Altura de los anemómetros del IDEAM y exponente de la ley potencial de
+# cizalladura (1/7 para terreno abierto) con que se extrapola a otra altura
+SENSOR_HEIGHT = 10.0
+SHEAR_EXPONENT = 1 / 7
+
+HOURS_PER_YEAR = 8760
+
+# Intervalos de velocidad (m/s) en que se integra la curva de potencia sobre
+# la distribución de Weibull
+WEIBULL_BINS = np.linspace(0.0, 40.0, 161)
+
+# Si cambia más de esta fracción de estaciones, los momentos se recalculan
+# en una sola pasada sobre todas las filas en lugar de estación por estación
+FULL_REFRESH_RATIO = 0.2
+
+# Combinaciones de (curva, altura) cuyas sumas de potencia se guardan
+MAX_POWER_TABLES = 32
+
+# Curva de potencia: velocidades (m/s) y potencia (kW) en cada una; por
+# encima de la última velocidad (corte) la potencia es cero
+PowerCurve = namedtuple('PowerCurve', ['speeds', 'power_kw'])
+
+
+def power_curve(speeds, power_kw):
+    """Valida y crea una curva de potencia; lanza ValueError si no es válida."""
+    speeds = np.asarray(speeds, dtype=np.float64)
+    power_kw = np.asarray(power_kw, dtype=np.float64)
+    if speeds.ndim != 1 or speeds.shape != power_kw.shape or len(speeds) < 2:
+        raise ValueError("La curva necesita al menos dos puntos, con tantas velocidades como potencias")
+    if np.any(np.diff(speeds) <= 0) or np.any(speeds < 0) or np.any(power_kw < 0):
+        raise ValueError("Las velocidades deben ser crecientes y las potencias no negativas")
+    return PowerCurve(speeds, power_kw)
+
+
+def _generic_curve(rated_kw, cut_in, rated_speed, cut_out):
+    # Curva genérica: crece con el cubo de la velocidad entre el arranque y la
+    # velocidad nominal, y se mantiene en la potencia nominal hasta el corte
+    ramp = np.linspace(cut_in, rated_speed, 10)
+    power = rated_kw * (ramp ** 3 - cut_in ** 3) / (rated_speed ** 3 - cut_in ** 3)
+    return power_curve(np.r_[ramp, cut_out], np.r_[power, rated_kw])
+
+
+TURBINES = {
+    'small-10kw': _generic_curve(10, 2.5, 11.0, 25.0),
+    'medium-250kw': _generic_curve(250, 3.0, 12.0, 25.0),
+    'utility-2mw': _generic_curve(2000, 3.0, 12.0, 25.0),
+}
+
+DEFAULT_TURBINE = 'utility-2mw'
+
+# Columnas del resultado por estación o municipio
+POTENTIAL_FIELDS = (
+    'samples',
+    'mean_speed',
+    'mean_cubic_speed',
+    'power_density',
+    'weibull_k',
+    'weibull_c',
+    'hub_height',
+    'hub_mean_speed',
+    'hub_power_density',
+    'aep_kwh',
+    'aep_empirical_kwh',
+    'capacity_factor',
+)
+
+
+def height_factor(hub_height, reference_height=SENSOR_HEIGHT, shear_exponent=SHEAR_EXPONENT):
+    """Factor por el que se multiplica la velocidad al pasar de la altura del sensor a `hub_height`."""
+    return (hub_height / reference_height) ** shear_exponent
+
+
+def weibull_moments(mean, std):
+    """Ajuste de Weibull por el método de momentos (aproximación de Justus).
+
+    k = (σ/μ)^-1.086 y c = μ / Γ(1 + 1/k). Devuelve NaN donde no hay
+    dispersión o la media no es positiva.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = np.where((mean > 0) & (std > 0), (std / mean) ** -1.086, np.nan)
+        gamma = np.array([math.gamma(1 + 1 / value) if np.isfinite(value) else np.nan for value in k.tolist()])
+        c = mean / gamma
+    return k, c
+
+
+def weibull_aep(k, c, curve):
+    """Energía anual (kWh) de la curva sobre la distribución de Weibull de cada fila.
+
+    La probabilidad de cada intervalo de WEIBULL_BINS sale de la función de
+    distribución acumulada, así que no hay problemas con la densidad en cero
+    cuando k < 1. Todas las estaciones se calculan en una sola operación.
+    """
+    k = np.asarray(k, dtype=np.float64)[:, None]
+    c = np.asarray(c, dtype=np.float64)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cdf = 1 - np.exp(-(WEIBULL_BINS[None, :] / c) ** k)
+    probability = np.diff(cdf, axis=1)
+    middle = (WEIBULL_BINS[1:] + WEIBULL_BINS[:-1]) / 2
+    power = np.interp(middle, curve.speeds, curve.power_kw, left=0.0, right=0.0)
+    return HOURS_PER_YEAR * probability @ power
+
+
+class WindPowerAnalyzer:
+    """Potencial eólico por estación y municipio, sobre todas las estaciones a la vez.
+
+    Mantiene por estación los momentos de la velocidad (n, Σv, Σv², Σv³), de
+    los que salen la velocidad media, la velocidad cúbica media, la densidad
+    de potencia y el ajuste de Weibull. La energía anual empírica (promedio de
+    la curva sobre cada observación) se guarda por (turbina, altura). Cuando
+    cambian los datos de una estación solo se recalculan sus valores (ver
+    `on_store_change`).
+    """
+
+    def __init__(self, store, air_density=AIR_DENSITY, reference_height=SENSOR_HEIGHT, shear_exponent=SHEAR_EXPONENT):
+        self.store = store
+        self.air_density = air_density
+        self.reference_height = reference_height
+        self.shear_exponent = shear_exponent
+        self._lock = threading.Lock()
+        # Código de estación -> (n, Σv, Σv², Σv³, municipio)
+        self._moments = {}
+        # (curva, altura) -> {código de estación: Σ potencia (kW) de sus observaciones}
+        self._power_sums = {}
+        self._dirty = set(store.station_codes())
+
+    def on_store_change(self, store, change):
+        stations = change.keys['station_code']
+        with self._lock:
+            self._dirty.update(stations)
+            for sums in self._power_sums.values():
+                for code in stations:
+                    sums.pop(code, None)
+
+    # ------------------------------------------------------------------
+    # Momentos y sumas de potencia por estación
+    # ------------------------------------------------------------------
+
+    def _grouped(self, rows=None):
+        # Códigos de estación distintos, grupo de cada fila con velocidad,
+        # sus velocidades y sus ids de fila
+        if rows is None:
+            rows = self.store.all_rows()
+        values = self.store.column('observed_value', rows)
+        valid = ~np.isnan(values)
+        rows = rows[valid]
+        keys, inverse = np.unique(self.store.column('station_code', rows), return_inverse=True)
+        return keys, inverse, values[valid], rows
+
+    def _refresh(self):
+        # El candado del almacén se toma antes que el propio, como en las
+        # notificaciones de cambios (ver `on_store_change`)
+        with self.store.reading(), self._lock:
+            dirty, self._dirty = self._dirty, set()
+            record_cache('wind_power_moments', not dirty)
+            if not dirty:
+                return
+            if len(dirty) > FULL_REFRESH_RATIO * max(len(self._moments), 1):
+                self._moments = {}
+                rows = None
+            else:
+                for code in dirty:
+                    self._moments.pop(code, None)
+                rows = np.concatenate([self.store.station_rows(code) for code in dirty])
+            with span('wind_power_moments_build'):
+                keys, inverse, values, rows = self._grouped(rows)
+                count = np.bincount(inverse, minlength=len(keys))
+                s1, s2, s3 = (np.bincount(inverse, weights=values ** power, minlength=len(keys)) for power in (1, 2, 3))
+                # Municipio de la primera fila de cada estación
+                first = np.zeros(len(keys), dtype=np.int64)
+                first[inverse[::-1]] = np.arange(len(inverse) - 1, -1, -1)
+                municipality = self.store.column('municipality', rows[first])
+                for i, code in enumerate(keys.tolist()):
+                    self._moments[code] = (int(count[i]), float(s1[i]), float(s2[i]), float(s3[i]), municipality[i])
+
+    def _power_sum_table(self, curve, hub_height):
+        # Σ potencia por estación para la curva y altura pedidas, calculando
+        # solo las estaciones que faltan en la caché
+        cache_key = (curve.speeds.tobytes(), curve.power_kw.tobytes(), hub_height)
+        with self._lock:
+            sums = self._power_sums.pop(cache_key, None)
+            if sums is None:
+                sums = {}
+                while len(self._power_sums) >= MAX_POWER_TABLES:
+                    self._power_sums.pop(next(iter(self._power_sums)))
+            # Se vuelve a insertar para que quede como la más reciente
+            self._power_sums[cache_key] = sums
+            missing = [code for code in self._moments if code not in sums]
+        record_cache('wind_power_table', not missing)
+        if missing:
+            with span('wind_power_table_build'), self.store.reading():
+                rows = None if len(missing) == len(self._moments) else np.concatenate(
+                    [self.store.station_rows(code) for code in missing])
+                keys, inverse, values, _ = self._grouped(rows)
+                speeds = values * height_factor(hub_height, self.reference_height, self.shear_exponent)
+                power = np.interp(speeds, curve.speeds, curve.power_kw, left=0.0, right=0.0)
+                totals = np.bincount(inverse, weights=power, minlength=len(keys))
+                # Se guardan antes de soltar la lectura: una escritura posterior
+                # que invalide estas estaciones debe encontrar ya sus sumas
+                with self._lock:
+                    sums.update(zip(keys.tolist(), totals.tolist()))
+        return sums
+
+    # ------------------------------------------------------------------
+    # Resultados
+    # ------------------------------------------------------------------
+
+    def _potential(self, count, s1, s2, s3, power_sum, curve, hub_height):
+        # Todas las métricas a partir de los momentos agregados de cada grupo
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = s1 / count
+            mean_cube = s3 / count
+            std = np.sqrt(np.maximum(s2 / count - mean ** 2, 0))
+        k, c = weibull_moments(mean, std)
+        factor = height_factor(hub_height, self.reference_height, self.shear_exponent)
+        rated = float(curve.power_kw.max())
+        aep = weibull_aep(k, c * factor, curve)
+        aep_empirical = HOURS_PER_YEAR * power_sum / count
+        return {
+            'samples': count.astype(np.int64),
+            'mean_speed': mean,
+            'mean_cubic_speed': mean_cube,
+            'power_density': 0.5 * self.air_density * mean_cube,
+            'weibull_k': k,
+            'weibull_c': c,
+            'hub_height': np.full(len(count), float(hub_height)),
+            'hub_mean_speed': mean * factor,
+            'hub_power_density': 0.5 * self.air_density * mean_cube * factor ** 3,
+            'aep_kwh': aep,
+            'aep_empirical_kwh': aep_empirical,
+            'capacity_factor': aep_empirical / (rated * HOURS_PER_YEAR) if rated > 0 else np.full(len(count), np.nan),
+        }
+
+    def station_potential(self, curve, hub_height, station_codes=None):
+        """Métricas por estación; devuelve los códigos y un diccionario de arreglos."""
+        self._refresh()
+        sums = self._power_sum_table(curve, hub_height)
+        moments = self._moments
+        codes = list(moments) if station_codes is None else [code for code in station_codes if code in moments]
+        table = np.array([moments[code][:4] for code in codes], dtype=np.float64).reshape(-1, 4)
+        power_sum = np.array([sums.get(code, 0.0) for code in codes], dtype=np.float64)
+        return codes, self._potential(*table.T, power_sum, curve, hub_height)
+
+    def municipality_potential(self, curve, hub_height, municipalities=None):
+        """Métricas por municipio, combinando los momentos de sus estaciones."""
+        self._refresh()
+        sums = self._power_sum_table(curve, hub_height)
+        codes = list(self._moments)
+        table = np.array([self._moments[code][:4] for code in codes], dtype=np.float64).reshape(-1, 4)
+        power_sum = np.array([sums.get(code, 0.0) for code in codes], dtype=np.float64)
+        names = np.array([self._moments[code][4] for code in codes], dtype=object)
+        if municipalities is not None:
+            wanted = {normalize_name(name) for name in municipalities}
+            keep = np.array([normalize_name(name) in wanted for name in names.tolist()], dtype=bool)
+            table, power_sum, names = table[keep], power_sum[keep], names[keep]
+
+        result_names, inverse = np.unique(names, return_inverse=True) if len(names) else (names, np.empty(0, dtype=np.int64))
+        grouped = [np.bincount(inverse, weights=column, minlength=len(result_names))
+                   for column in (*table.T, power_sum)]
+        return result_names.tolist(), self._potential(*grouped, curve, hub_height)
+
+
+def potential_records(keys, metrics, key_name):
+    """Convierte el resultado por columnas en una lista de diccionarios (NaN como None)."""
+    columns = [np.asarray(metrics[name], dtype=np.float64) for name in POTENTIAL_FIELDS]
+    rounded = [np.where(np.isnan(column), None, np.round(column, 4)).tolist() for column in columns]
+    records = []
+    for i, key in enumerate(keys):
+        record = {key_name: key}
+        for name, values in zip(POTENTIAL_FIELDS, rounded):
+            record[name] = values[i]
+        record['samples'] = int(record['samples'])
+        records.append(record)
+    return records
+
+
+def rank(keys, metrics, sort_by, limit=None):
+    """Ordena de mayor a menor por una métrica (NaN al final) y recorta a `limit`."""
+    values = np.asarray(metrics[sort_by], dtype=np.float64)
+    order = np.argsort(np.where(np.isnan(values), np.inf, -values), kind='stable')[:limit]
+    return [keys[i] for i in order.tolist()], {name: np.asarray(column)[order] for name, column in metrics.items()}
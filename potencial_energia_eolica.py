@@ -1,37 +1,20 @@
-from fastapi import FastAPI, HTTPException
+from typing import List
+
+import numpy as np
+from fastapi import APIRouter, FastAPI, HTTPException, Request
 from fastapi.responses import HTMLResponse
-import pandas as pd
-from sklearn.naive_bayes import GaussianNB
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
-
-# Ruta al archivo CSV
-path = "D:\\Documentos 2\\Universidad_2\\Programming\\MinTIC\\Proyecto Energias Limpias\\Velocidades_viento_prueba.csv"
-
-# Función para cargar y limpiar los datos
-def load_wind_data():
-    try:
-        # Cargar datos
-        df = pd.read_csv(path, on_bad_lines="skip")
-        
-        # Asegurarse de que 'valorobservado' sea de tipo numérico
-        df['valorobservado'] = pd.to_numeric(df['valorobservado'], errors='coerce')
-        
-        # Eliminar filas con valores NaN
-        df = df.dropna(subset=['valorobservado'])
-        
-        # Renombrar columnas
-        df = df.rename(columns={
-            'valorobservado': 'observed_value',
-            'municipio': 'municipality'
-        })
-        
-        # Agregar una columna de clasificación
-        df['classification'] = df['observed_value'].apply(classify_wind_speed)
-        return df
-    except Exception as e:
-        print(f"Error al cargar los datos: {e}")
-        return pd.DataFrame()
+from pydantic import BaseModel
+
+from cache_viento import name_tags
+from contexto_viento import get_wind_context
+from datos_viento import WIND_CLASSES, classify_wind_codes
+from ejecucion import get_work_pool
+from metricas import install_metrics, span
+
+# Datos de viento y modelo compartidos con las demás APIs del proceso; el
+# CSV se configura con WIND_DATA_PATH (ver configuracion.py y main.py)
+wind_context = get_wind_context()
+wind_store = wind_context.store
 
 # Función para clasificar velocidades del viento
 def classify_wind_speed(value):
@@ -42,32 +25,21 @@ def classify_wind_speed(value):
     else:
         return 'Excelente'
 
-# Entrenar un modelo Naive Bayes
-def train_naive_bayes_model(df):
-    try:
-        X = df[['observed_value']].values  # Características (velocidad del viento)
-        y = df['classification'].apply(lambda x: {'Mala': 0, 'Buena': 1, 'Excelente': 2}[x]).values  # Clases codificadas
-        
-        # Dividir los datos en entrenamiento y prueba
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        
-        # Entrenar el modelo
-        model = GaussianNB()
-        model.fit(X_train, y_train)
-        
-        # Evaluar el modelo
-        y_pred = model.predict(X_test)
-        accuracy = accuracy_score(y_test, y_pred)
-        print(f"Precisión del modelo: {accuracy:.2f}")
-        
-        return model
-    except Exception as e:
-        print(f"Error al entrenar el modelo: {e}")
-        return None
-
-# Cargar los datos y entrenar el modelo
-wind_data = load_wind_data()
-naive_bayes_model = train_naive_bayes_model(wind_data)
+# Gestor del modelo Naive Bayes: carga la última versión guardada o la
+# entrena en segundo plano, y la actualiza cuando cambian los datos
+model_manager = wind_context.model_manager
+
+# Las clasificaciones por lotes corren en el pool de trabajo pesado; la de un
+# solo municipio usa los agregados precalculados y se resuelve en la ruta
+work_pool = get_work_pool()
+
+# Respuestas ya serializadas con ETag; dependen de los datos del municipio y
+# de la versión del modelo
+response_cache = wind_context.response_cache
+
+# Las rutas se definen en un router para poder montarlas en la aplicación
+# combinada (main.py); `app` sirve esta API por separado
+router = APIRouter()
 
 # Crear la aplicación FastAPI
 app = FastAPI(
@@ -75,38 +47,131 @@ app = FastAPI(
     version="1.0.0",
     description="API para clasificar el potencial de implementación de proyectos eólicos."
 )
+install_metrics(app)
 
 @app.get("/", tags=["Home"])
 def home():
     return HTMLResponse("<h1>Bienvenido a la API de Clasificación de Viento para Proyectos Eólicos</h1>")
 
-@app.get("/wind-data/municipality/classification/{municipality}", tags=["Classification"])
-def classify_wind_for_municipality(municipality: str):
+@router.get("/wind-data/municipality/classification/{municipality}", tags=["Classification"])
+async def classify_wind_for_municipality(municipality: str, request: Request):
     """
     Clasifica el potencial eólico de un municipio basado en los datos observados.
     """
-    if wind_data.empty:
+    if not len(wind_store):
         raise HTTPException(status_code=500, detail="Los datos no están disponibles.")
+    return await response_cache.respond(
+        request, name_tags('municipality', wind_store.municipality_codes(municipality, exact=True)),
+        lambda: municipality_classification(municipality), extra=(model_manager.version,))
+
+def municipality_classification(municipality):
+    # Agregados precalculados del municipio
+    with span('wind_classification'):
+        summary = wind_store.municipality_summary(municipality, exact=True)
     
-    # Filtrar datos por municipio
-    municipality_data = wind_data[wind_data['municipality'].str.lower() == municipality.lower()]
-    
-    if municipality_data.empty:
+    if summary is None:
         raise HTTPException(status_code=404, detail=f"No se encontraron datos para el municipio: {municipality}")
     
-    # Calcular el promedio de velocidades observadas
-    avg_speed = municipality_data['observed_value'].mean()
+    # Promedio de velocidades observadas
+    avg_speed = summary['mean']
     
-    # Usar el modelo para predecir la clasificación
-    prediction = naive_bayes_model.predict([[avg_speed]])[0]
+    # Usar el modelo para predecir la clasificación; mientras no hay un
+    # modelo entrenado se usan los umbrales fijos
+    model = model_manager.model
+    if model is not None:
+        with span('model_predict'):
+            prediction = model.predict([[avg_speed]])[0]
+    else:
+        prediction = classify_wind_codes([avg_speed])[0]
     classification = {0: 'Mala', 1: 'Buena', 2: 'Excelente'}[prediction]
     
     return {
         "municipality": municipality,
         "average_speed": avg_speed,
-        "classification": classification
+        "classification": classification,
+        "model_version": model_manager.version if model is not None else None
+    }
+
+@router.get("/model", tags=["Model"])
+async def get_model_status():
+    """
+    Versión activa del modelo y métricas de su último entrenamiento.
+    """
+    return model_manager.status()
+
+@router.post("/model/retrain", tags=["Model"], status_code=202)
+def retrain_model():
+    """
+    Programa un reentrenamiento completo en segundo plano.
+    """
+    model_manager.train_async(wind_store)
+    return model_manager.status()
+
+# Modelo Pydantic para la clasificación por lotes
+class BatchClassificationRequest(BaseModel):
+    municipalities: List[str] = []
+    stations: List[int] = []
+    speeds: List[float] = []
+    all_municipalities: bool = False
+    all_stations: bool = False
+
+@router.post("/wind-data/classification/batch", tags=["Classification"])
+async def classify_wind_batch(request: BatchClassificationRequest):
+    """
+    Clasifica en una sola llamada listas de municipios, estaciones o
+    velocidades. Los promedios por grupo salen de los agregados precalculados
+    y el modelo se evalúa una sola vez sobre todos los promedios.
+    """
+    # Los lotes idénticos sobre los mismos datos y modelo comparten el cálculo
+    key = (
+        'batch', wind_store.version, model_manager.version,
+        tuple(request.municipalities), tuple(request.stations), tuple(request.speeds),
+        request.all_municipalities, request.all_stations,
+    )
+    return await work_pool.run(classify_batch, request, key=key)
+
+def classify_batch(request):
+    model = model_manager.model
+    with wind_store.reading():
+        municipalities, municipality_speeds = wind_store.municipality_means(
+            None if request.all_municipalities else request.municipalities)
+        stations, station_speeds = wind_store.station_means(
+            None if request.all_stations else request.stations)
+
+    kinds = ['municipality'] * len(municipalities) + ['station'] * len(stations) + ['speed'] * len(request.speeds)
+    keys = municipalities + stations + request.speeds
+    speeds = np.concatenate([municipality_speeds, station_speeds, np.asarray(request.speeds, dtype=np.float64)])
+
+    # Los grupos sin datos quedan fuera de la predicción
+    found = ~np.isnan(speeds)
+    results = []
+    if found.any():
+        if model is not None:
+            with span('model_predict'):
+                probabilities = model.predict_proba(speeds[found].reshape(-1, 1))
+            class_names = [WIND_CLASSES[code] for code in model.classes_]
+        else:
+            # Sin modelo entrenado: clasificación por umbrales con probabilidad 1
+            probabilities = np.eye(len(WIND_CLASSES))[classify_wind_codes(speeds[found])]
+            class_names = list(WIND_CLASSES)
+        predictions = np.asarray(class_names)[probabilities.argmax(axis=1)].tolist()
+        for position, (index, classification) in enumerate(zip(np.flatnonzero(found).tolist(), predictions)):
+            results.append({
+                "type": kinds[index],
+                "key": keys[index],
+                "average_speed": float(speeds[index]),
+                "classification": classification,
+                "probabilities": dict(zip(class_names, probabilities[position].tolist()))
+            })
+
+    return {
+        "model_version": model_manager.version if model is not None else None,
+        "results": results,
+        "not_found": [{"type": kinds[index], "key": keys[index]} for index in np.flatnonzero(~found).tolist()]
     }
 
+app.include_router(router)
+
 #para correr la app: uvicorn main:app --reload
 #uvirconr nombreApp:app --reload --port 5000
 # http://127.0.0.1:8000/docs
@@ -0,0 +1,197 @@
+import csv
+import io
+import json
+from typing import Optional
+
+import numpy as np
+from fastapi import HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+
+from datos_viento import COLUMNS
+from series_viento import AGGREGATIONS, GRANULARITIES, parse_time, parse_window
+
+# orjson es opcional: si no está instalado se usa el módulo json estándar
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Número de filas que se codifican juntas al transmitir una respuesta
+STREAM_BATCH_SIZE = 5_000
+
+MEDIA_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def dumps(value):
+    """Codifica un valor a JSON (bytes) con orjson si está disponible."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+class WindQuery:
+    """Parámetros de paginación, proyección y formato de las rutas de datos de viento."""
+
+    def __init__(
+        self,
+        fields: Optional[str] = Query(None, description="Columnas separadas por comas, p. ej. station_code,observed_value"),
+        format: str = Query('json', pattern='^(json|ndjson|csv)$', description="json, ndjson o csv"),
+        offset: int = Query(0, ge=0, description="Filas que se omiten desde el inicio (o desde el cursor)"),
+        limit: Optional[int] = Query(None, ge=1, description="Máximo de filas a devolver"),
+        cursor: Optional[int] = Query(None, ge=0, description="Devuelve las filas posteriores a este cursor"),
+    ):
+        self.fields = parse_fields(fields)
+        self.format = format
+        self.offset = offset
+        self.limit = limit
+        self.cursor = cursor
+
+
+def parse_fields(fields):
+    if not fields:
+        return list(COLUMNS)
+    selected = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in selected if name not in COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Columnas desconocidas: {', '.join(unknown)}")
+    return selected
+
+
+def paginate(store, rows, query):
+    """Recorta las filas (ordenadas por id) según cursor, offset y límite.
+
+    Devuelve la página y el cursor de la siguiente, o None si es la última.
+    El cursor es el número de secuencia de la última fila entregada (ver
+    `WindStore.sequence`), que no cambia al agregar filas ni al compactar.
+    """
+    start = 0
+    if query.cursor is not None:
+        start = int(np.searchsorted(rows, store.first_row_after(query.cursor), side='left'))
+    start += query.offset
+    end = len(rows) if query.limit is None else start + query.limit
+    page = rows[start:end]
+    next_cursor = int(store.sequence(page[-1])) if end < len(rows) and len(page) else None
+    return page, next_cursor
+
+
+def _batches(store, sequences, read):
+    # Las respuestas transmitidas llevan los números de secuencia de la
+    # página y no sus ids de fila: cada lote se lee con el candado de lectura
+    # y busca de nuevo sus filas, porque entre un lote y otro puede haber una
+    # compactación. El candado no se mantiene entre lotes, que pueden
+    # enviarse desde hilos distintos y tardar lo que tarde el cliente.
+    for start in range(0, len(sequences), STREAM_BATCH_SIZE):
+        with store.reading():
+            batch = read(store.sequence_rows(sequences[start:start + STREAM_BATCH_SIZE]))
+        yield batch
+
+
+def _stream_json(store, sequences, fields):
+    yield b'['
+    first = True
+    for records in _batches(store, sequences, lambda rows: store.records(rows, fields)):
+        body = dumps(records)[1:-1]
+        if body:
+            yield body if first else b',' + body
+            first = False
+    yield b']'
+
+
+def _stream_ndjson(store, sequences, fields):
+    for records in _batches(store, sequences, lambda rows: store.records(rows, fields)):
+        yield b''.join(dumps(record) + b'\n' for record in records)
+
+
+def _stream_csv(store, sequences, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for values in _batches(store, sequences, lambda rows: [store.json_values(name, rows) for name in fields]):
+        writer.writerows(zip(*values))
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+STREAMERS = {
+    'json': _stream_json,
+    'ndjson': _stream_ndjson,
+    'csv': _stream_csv,
+}
+
+
+def wind_data_response(store, select_rows, query):
+    """Respuesta paginada con las filas de `select_rows()`, en el formato de `query`.
+
+    Las filas se buscan y se leen con el candado de lectura del almacén. Las
+    páginas pequeñas en JSON se codifican de una vez; el resto se transmite
+    por lotes para no materializar toda la respuesta en memoria. Los
+    metadatos de paginación van en las cabeceras para que el cuerpo siga
+    siendo una lista de registros.
+    """
+    with store.reading():
+        rows = select_rows()
+        page, next_cursor = paginate(store, rows, query)
+        headers = {'X-Total-Count': str(len(rows))}
+        if next_cursor is not None:
+            headers['X-Next-Cursor'] = str(next_cursor)
+
+        if query.format == 'json' and len(page) <= STREAM_BATCH_SIZE:
+            records = store.records(page, query.fields)
+        else:
+            records, sequences = None, store.sequence(page)
+    if records is not None:
+        return Response(dumps(records), media_type=MEDIA_TYPES['json'], headers=headers)
+    return StreamingResponse(
+        STREAMERS[query.format](store, sequences, query.fields),
+        media_type=MEDIA_TYPES[query.format],
+        headers=headers,
+    )
+
+
+class SeriesQuery:
+    """Rango de fechas y agregación de las rutas de series de tiempo."""
+
+    def __init__(
+        self,
+        start: Optional[str] = Query(None, description="Fecha inicial ISO, incluida (p. ej. 2019 o 2019-03-01T06:00)"),
+        end: Optional[str] = Query(None, description="Fecha final ISO, excluida"),
+        agg: str = Query('mean', pattern=f"^({'|'.join(AGGREGATIONS)})$", description="mean, min, max, sum o count"),
+        max_points: Optional[int] = Query(None, ge=1, description="Reduce la serie a este máximo de puntos"),
+    ):
+        try:
+            self.start = parse_time(start)
+            self.end = parse_time(end)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Fecha no válida: {e}")
+        self.agg = agg
+        self.max_points = max_points
+
+
+GRANULARITY_PATTERN = f"^({'|'.join([*GRANULARITIES, 'raw'])})$"
+
+
+def parse_series_window(window):
+    try:
+        return parse_window(window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def series_response(times, values, **extra):
+    """Serie de tiempo en JSON por columnas: fechas ISO y valores (NaN como null)."""
+    unit = 's' if np.datetime_data(times.dtype)[0] in ('ns', 'us', 'ms') else None
+    values = np.asarray(values, dtype=np.float64)
+    body = {
+        **extra,
+        'points': int(len(times)),
+        'time': np.datetime_as_string(times, unit=unit).tolist() if unit else np.datetime_as_string(times).tolist(),
+        'value': np.where(np.isnan(values), None, np.round(values, 4)).tolist(),
+    }
+    return Response(dumps(body), media_type=MEDIA_TYPES['json'])
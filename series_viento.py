@@ -0,0 +1,224 @@
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from metricas import record_cache, span
+
+# Granularidades de remuestreo y la unidad de datetime64 a la que se truncan
+GRANULARITIES = {
+    'hour': 'h',
+    'day': 'D',
+    'month': 'M',
+    'year': 'Y',
+}
+
+AGGREGATIONS = ('mean', 'min', 'max', 'sum', 'count')
+
+# Máximo de series (estaciones o municipios) ordenadas que se guardan, y de
+# resultados guardados por cada una
+MAX_LAYOUTS = 256
+MAX_RESULTS_PER_LAYOUT = 64
+
+WINDOW_FORMAT = re.compile(r'^\d+\s*(min|h|d|D)$')
+
+
+def parse_time(value):
+    """Convierte un texto ISO (p. ej. '2019' o '2019-03-01T06:00') a datetime64[ns]; None si no hay valor."""
+    if value is None or value == '':
+        return None
+    return np.datetime64(value, 'ns')
+
+
+def parse_window(window):
+    """Convierte una ventana como '24h', '7D' o '30min' a timedelta64[ns]."""
+    if not WINDOW_FORMAT.match(window.strip()):
+        raise ValueError(f"Ventana no válida: {window}")
+    return pd.Timedelta(window.strip().replace('d', 'D')).to_timedelta64()
+
+
+def _bucket_starts(buckets):
+    # Posiciones donde empieza cada cubeta en un arreglo ordenado
+    if not len(buckets):
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+
+
+def _reduce(values, starts, agg):
+    """Agrega `values` por tramos que empiezan en `starts` (ordenados)."""
+    if not len(starts):
+        return np.empty(0, dtype=np.float64)
+    counts = np.diff(np.r_[starts, len(values)])
+    if agg == 'count':
+        return counts.astype(np.float64)
+    if agg == 'min':
+        return np.minimum.reduceat(values, starts)
+    if agg == 'max':
+        return np.maximum.reduceat(values, starts)
+    sums = np.add.reduceat(values, starts)
+    return sums if agg == 'sum' else sums / counts
+
+
+def downsample(times, values, max_points, agg='mean'):
+    """Reduce una serie a lo sumo a `max_points` puntos agregando tramos de igual tamaño.
+
+    Cada punto conserva el tiempo del inicio de su tramo. Con 'max' o 'min'
+    se conservan los picos, que un promedio escondería.
+    """
+    if max_points is None or len(times) <= max_points:
+        return times, values
+    starts = np.linspace(0, len(times), max_points, endpoint=False).astype(np.int64)
+    starts = np.unique(starts)
+    return times[starts], _reduce(values, starts, agg if agg in ('min', 'max') else 'mean')
+
+
+class _Layout:
+    """Serie de una estación o municipio ordenada por fecha, con sus resultados en caché."""
+
+    def __init__(self, times, values):
+        self.times = times
+        self.values = values
+        self.results = OrderedDict()
+
+    def range(self, start=None, end=None):
+        """Tiempos y valores en [start, end) mediante búsqueda binaria."""
+        lo = 0 if start is None else int(np.searchsorted(self.times, start, side='left'))
+        hi = len(self.times) if end is None else int(np.searchsorted(self.times, end, side='left'))
+        return self.times[lo:hi], self.values[lo:hi]
+
+
+class WindSeries:
+    """Consultas de series de tiempo sobre el almacén de viento.
+
+    Para cada estación o municipio consultado se guarda una copia de sus
+    observaciones ordenadas por fecha; los rangos se resuelven con búsqueda
+    binaria y los remuestreos con operaciones `reduceat` de NumPy. Los
+    resultados se guardan por (serie, rango, granularidad, agregación) y se
+    descartan cuando cambian los datos de esa estación o municipio (ver
+    `on_store_change`).
+    """
+
+    def __init__(self, store, max_layouts=MAX_LAYOUTS):
+        self.store = store
+        self.max_layouts = max_layouts
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+        # Cambia con cada mutación; una serie construida mientras cambiaban los
+        # datos se usa para esa consulta pero no se guarda
+        self._generation = 0
+
+    # ------------------------------------------------------------------
+    # Series ordenadas por fecha
+    # ------------------------------------------------------------------
+
+    def _build_layout(self, rows):
+        times = self.store.column('observation_date', rows)
+        values = self.store.column('observed_value', rows)
+        valid = ~np.isnat(times) & ~np.isnan(values)
+        times, values = times[valid], values[valid]
+        order = np.argsort(times, kind='stable')
+        return _Layout(times[order], values[order].astype(np.float64))
+
+    def _layout(self, key, rows_for_key):
+        with self._lock:
+            layout = self._layouts.get(key)
+            record_cache('wind_series_layout', layout is not None)
+            if layout is not None:
+                self._layouts.move_to_end(key)
+                return layout
+            generation = self._generation
+        # Las filas se buscan y se leen sin que una compactación cambie sus ids
+        with span('wind_series_layout_build'), self.store.reading():
+            layout = self._build_layout(rows_for_key())
+        with self._lock:
+            if generation != self._generation:
+                return layout
+            self._layouts[key] = layout
+            while len(self._layouts) > self.max_layouts:
+                self._layouts.popitem(last=False)
+        return layout
+
+    def station_layout(self, station_code):
+        return self._layout(('station_code', station_code), lambda: self.store.station_rows(station_code))
+
+    def municipality_layout(self, municipality):
+        """Serie combinada de las estaciones de un municipio (nombre exacto, sin mayúsculas)."""
+        codes = tuple(self.store.municipality_codes(municipality, exact=True))
+        return self._layout(('municipality', codes), lambda: self.store.municipality_rows(municipality, exact=True))
+
+    def on_store_change(self, store, change):
+        """Descarta las series, y sus resultados, de las estaciones y municipios que cambiaron."""
+        stations = change.keys['station_code']
+        municipalities = change.keys['municipality']
+        with self._lock:
+            self._generation += 1
+            for key in list(self._layouts):
+                kind, value = key
+                if (kind == 'station_code' and value in stations) or (
+                        kind == 'municipality' and municipalities.intersection(value)):
+                    del self._layouts[key]
+
+    def _cached(self, layout, key, compute):
+        results = layout.results
+        result = results.get(key)
+        record_cache('wind_series_result', result is not None)
+        if result is None:
+            result = compute()
+            results[key] = result
+            while len(results) > MAX_RESULTS_PER_LAYOUT:
+                results.popitem(last=False)
+        return result
+
+    # ------------------------------------------------------------------
+    # Consultas; los resultados son tuplas de arreglos
+    # ------------------------------------------------------------------
+
+    def resample(self, layout, start=None, end=None, granularity='hour', agg='mean', max_points=None):
+        """Agrega la serie por hora, día, mes o año; granularity=None devuelve las observaciones."""
+        def compute():
+            times, values = layout.range(start, end)
+            if granularity is None:
+                return downsample(times, values, max_points, agg)
+            buckets = times.astype(f'datetime64[{GRANULARITIES[granularity]}]')
+            starts = _bucket_starts(buckets)
+            return downsample(buckets[starts], _reduce(values, starts, agg), max_points, agg)
+
+        return self._cached(layout, ('resample', start, end, granularity, agg, max_points), compute)
+
+    def rolling(self, layout, window, start=None, end=None, agg='mean', max_points=None):
+        """Agregación móvil en una ventana de tiempo que termina en cada observación.
+
+        La ventana incluye observaciones anteriores a `start`, para que el
+        primer punto del rango no quede calculado con una ventana incompleta.
+        """
+        def compute():
+            context = None if start is None else start - window
+            times, values = layout.range(context, end)
+            series = pd.Series(values, index=pd.DatetimeIndex(times))
+            rolled = getattr(series.rolling(pd.Timedelta(window)), agg)().to_numpy(dtype=np.float64)
+            keep = slice(None) if start is None else slice(int(np.searchsorted(times, start, side='left')), None)
+            return downsample(times[keep], rolled[keep], max_points, agg)
+
+        return self._cached(layout, ('rolling', window, start, end, agg, max_points), compute)
+
+    def exceedance(self, layout, threshold, start=None, end=None, granularity='month', base='hour'):
+        """Porcentaje de periodos `base` por encima de `threshold`, por cada periodo `granularity`.
+
+        Con base='hour' primero se promedia cada hora y luego se cuenta qué
+        porcentaje de las horas con datos de cada mes superó el umbral.
+        Devuelve (tiempos, porcentajes, periodos base con datos).
+        """
+        def compute():
+            if base is None:
+                times, values = layout.range(start, end)
+            else:
+                times, values = self.resample(layout, start, end, base, 'mean')
+            buckets = times.astype(f'datetime64[{GRANULARITIES[granularity]}]')
+            starts = _bucket_starts(buckets)
+            above = _reduce((values > threshold).astype(np.float64), starts, 'sum')
+            counts = _reduce(values, starts, 'count')
+            return buckets[starts], 100 * above / np.maximum(counts, 1), counts.astype(np.int64)
+
+        return self._cached(layout, ('exceedance', threshold, start, end, granularity, base), compute)
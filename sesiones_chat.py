@@ -0,0 +1,161 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# redis es opcional: solo se necesita para el backend compartido entre servidores
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Nombre de la cookie y de la cabecera con el identificador de sesión
+COOKIE_SESION = "sesion_chat"
+CABECERA_SESION = "X-Session-Id"
+
+# Formato aceptado para identificadores enviados por el cliente
+FORMATO_ID_SESION = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+# Tiempo de vida de una sesión sin actividad, en segundos
+TTL_SESION = 30 * 60
+
+# Máximo de sesiones que se guardan en memoria por proceso
+MAX_SESIONES = 10_000
+
+
+def estado_inicial():
+    """Estado de una conversación nueva."""
+    return {
+        "paso": 0,
+        "usuario_info": {},
+        "palabra_count": {"ahorro": 0, "energia": 0},
+    }
+
+
+class SesionesMemoria:
+    """Sesiones en memoria del proceso, con expiración por TTL y desalojo LRU.
+
+    Sirve para un solo worker; con varios workers se usa un backend
+    compartido (SQLite o Redis).
+    """
+
+    def __init__(self, max_sesiones=MAX_SESIONES, ttl=TTL_SESION):
+        self.max_sesiones = max_sesiones
+        self.ttl = ttl
+        self._sesiones = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sesiones)
+
+    def obtener(self, id_sesion):
+        with self._lock:
+            entrada = self._sesiones.get(id_sesion)
+            if entrada is None:
+                return None
+            expira, estado = entrada
+            if expira < time.monotonic():
+                del self._sesiones[id_sesion]
+                return None
+            self._sesiones.move_to_end(id_sesion)
+            return estado
+
+    def guardar(self, id_sesion, estado):
+        with self._lock:
+            self._sesiones[id_sesion] = (time.monotonic() + self.ttl, estado)
+            self._sesiones.move_to_end(id_sesion)
+            # Se desalojan las sesiones menos usadas cuando se supera el límite
+            while len(self._sesiones) > self.max_sesiones:
+                self._sesiones.popitem(last=False)
+
+    def borrar(self, id_sesion):
+        with self._lock:
+            self._sesiones.pop(id_sesion, None)
+
+
+class SesionesSQLite:
+    """Sesiones en un archivo SQLite, compartidas por los workers de una máquina."""
+
+    # Cada cuántas escrituras se borran las sesiones vencidas
+    PURGA_CADA = 1_000
+
+    def __init__(self, ruta, ttl=TTL_SESION):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._escrituras = 0
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS sesiones (id TEXT PRIMARY KEY, estado TEXT NOT NULL, expira REAL NOT NULL)"
+        )
+
+    def obtener(self, id_sesion):
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT estado FROM sesiones WHERE id = ? AND expira > ?", (id_sesion, time.time())
+            ).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def guardar(self, id_sesion, estado):
+        with self._lock:
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO sesiones (id, estado, expira) VALUES (?, ?, ?)",
+                (id_sesion, json.dumps(estado), time.time() + self.ttl),
+            )
+            self._escrituras += 1
+            if self._escrituras % self.PURGA_CADA == 0:
+                self._conexion.execute("DELETE FROM sesiones WHERE expira <= ?", (time.time(),))
+
+    def borrar(self, id_sesion):
+        with self._lock:
+            self._conexion.execute("DELETE FROM sesiones WHERE id = ?", (id_sesion,))
+
+
+class SesionesRedis:
+    """Sesiones en Redis (o un servidor compatible), compartidas entre máquinas."""
+
+    def __init__(self, url, ttl=TTL_SESION, prefijo="sesion_chat:"):
+        if redis is None:
+            raise RuntimeError("El backend de sesiones Redis requiere el paquete 'redis'")
+        self.ttl = ttl
+        self.prefijo = prefijo
+        self._cliente = redis.Redis.from_url(url)
+
+    def obtener(self, id_sesion):
+        valor = self._cliente.get(self.prefijo + id_sesion)
+        return json.loads(valor) if valor else None
+
+    def guardar(self, id_sesion, estado):
+        self._cliente.setex(self.prefijo + id_sesion, self.ttl, json.dumps(estado))
+
+    def borrar(self, id_sesion):
+        self._cliente.delete(self.prefijo + id_sesion)
+
+
+def crear_almacen_sesiones(url="memoria"):
+    """Crea el backend de sesiones a partir de una URL.
+
+    'memoria' (por defecto), 'sqlite:///ruta/al/archivo.db' o 'redis://host:puerto/0'.
+    """
+    if url == "memoria":
+        return SesionesMemoria()
+    if url.startswith("sqlite:///"):
+        return SesionesSQLite(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return SesionesRedis(url)
+    raise ValueError(f"Backend de sesiones no soportado: {url}")
+
+
+def id_sesion_de(request):
+    """Identificador de sesión enviado por el cliente (cabecera o cookie), o None."""
+    id_sesion = request.headers.get(CABECERA_SESION) or request.cookies.get(COOKIE_SESION)
+    if id_sesion and FORMATO_ID_SESION.match(id_sesion):
+        return id_sesion
+    return None
+
+
+def nuevo_id_sesion():
+    return uuid.uuid4().hex
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from datos_viento import WindStore, load_wind_csv
+from metricas import ROWS_LOADED, record_cache, span
+
+# Versión del formato en disco; cambiarla invalida las instantáneas anteriores
+SNAPSHOT_VERSION = 3
+
+# Bytes del inicio y del final del CSV que entran en la huella del archivo
+FINGERPRINT_SAMPLE = 1024 * 1024
+
+
+def default_snapshot_dir(path):
+    """Directorio de instantáneas junto al CSV de origen."""
+    return os.path.join(os.path.dirname(os.path.abspath(path)), '.snapshots_viento')
+
+
+def source_fingerprint(path, drop_missing_values=False):
+    """Huella del CSV de origen que identifica su instantánea.
+
+    Combina tamaño, fecha de modificación y el contenido del primer y el
+    último MiB del archivo, para no tener que leer archivos de decenas de GB
+    en cada arranque. También incluye la versión del formato y la forma de
+    limpieza, porque cambian el contenido de la instantánea.
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    digest.update(f"{SNAPSHOT_VERSION}:{stat.st_size}:{stat.st_mtime_ns}:{drop_missing_values}".encode())
+    with open(path, 'rb') as handle:
+        digest.update(handle.read(FINGERPRINT_SAMPLE))
+        if stat.st_size > FINGERPRINT_SAMPLE:
+            handle.seek(max(stat.st_size - FINGERPRINT_SAMPLE, FINGERPRINT_SAMPLE))
+            digest.update(handle.read())
+    return digest.hexdigest()
+
+
+def snapshot_path(path, drop_missing_values=False, snapshot_dir=None):
+    root = snapshot_dir or default_snapshot_dir(path)
+    return os.path.join(root, source_fingerprint(path, drop_missing_values))
+
+
+def save_snapshot(store, directory, source=None):
+    """Escribe el almacén como un .npy por arreglo más un manifest.json.
+
+    Se escribe en un directorio temporal que luego se renombra, para que un
+    proceso que arranca al mismo tiempo nunca vea una instantánea a medias.
+    """
+    arrays, metadata = store.export_state()
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+    try:
+        for name, values in arrays.items():
+            np.save(os.path.join(staging, f'{name}.npy'), np.ascontiguousarray(values))
+        manifest = {
+            'version': SNAPSHOT_VERSION,
+            'source': source,
+            'arrays': sorted(arrays),
+            **metadata,
+        }
+        with open(os.path.join(staging, 'manifest.json'), 'w', encoding='utf-8') as handle:
+            json.dump(manifest, handle, ensure_ascii=False)
+        try:
+            os.replace(staging, directory)
+        except OSError:
+            # Otro proceso ya escribió la misma instantánea
+            shutil.rmtree(staging, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def load_snapshot(directory):
+    """Carga una instantánea mapeando sus arreglos en memoria; None si no existe.
+
+    Los arreglos se abren con mmap en modo copy-on-write: varios procesos que
+    cargan la misma instantánea comparten las páginas del sistema operativo
+    hasta que alguno modifica una fila.
+    """
+    manifest_path = os.path.join(directory, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding='utf-8') as handle:
+        manifest = json.load(handle)
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        return None
+    arrays = {
+        name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='c')
+        for name in manifest['arrays']
+    }
+    return WindStore.from_state(arrays, manifest)
+
+
+def load_wind_store(path, drop_missing_values=False, snapshot_dir=None):
+    """Carga el almacén desde su instantánea o, si no existe, desde el CSV.
+
+    Después de leer el CSV se escribe la instantánea para los siguientes
+    arranques. Devuelve el almacén y el directorio de la instantánea.
+    """
+    directory = snapshot_path(path, drop_missing_values, snapshot_dir)
+    with span('wind_load_snapshot'):
+        store = load_snapshot(directory)
+    record_cache('wind_snapshot', store is not None)
+    if store is not None:
+        ROWS_LOADED.labels('snapshot').inc(len(store))
+        return store, directory
+
+    store = load_wind_csv(path, drop_missing_values=drop_missing_values)
+    try:
+        save_snapshot(store, directory, source=os.path.abspath(path))
+    except OSError as e:
+        print(f"No se pudo guardar la instantánea: {e}")
+    return store, directory
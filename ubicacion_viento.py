@@ -0,0 +1,239 @@
+import threading
+
+import numpy as np
+
+from datos_viento import LATITUDE_RANGE, LONGITUDE_RANGE, normalize_name
+from metricas import span
+
+# scipy es opcional: sin él las búsquedas recorren todas las estaciones con
+# NumPy, lo que sigue siendo rápido para unos pocos miles de estaciones
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_unit_vectors(latitude, longitude):
+    """Coordenadas geográficas en grados a vectores unitarios (x, y, z)."""
+    lat = np.radians(np.asarray(latitude, dtype=np.float64))
+    lon = np.radians(np.asarray(longitude, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_to_km(chord):
+    # Distancia en línea recta entre vectores unitarios -> distancia sobre la superficie
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def km_to_chord(distance_km):
+    return 2 * np.sin(min(distance_km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+class _StationPoints:
+    """Coordenadas y árbol de una versión del índice; no se modifica después de construirse."""
+
+    def __init__(self, stations):
+        codes = np.fromiter(stations, dtype=np.int64, count=len(stations))
+        entries = [stations[code] for code in codes.tolist()]
+        self.codes = codes
+        self.latitude = np.array([entry[0] for entry in entries], dtype=np.float64)
+        self.longitude = np.array([entry[1] for entry in entries], dtype=np.float64)
+        self.names = np.array([entry[2] for entry in entries], dtype=object)
+        self.municipalities = np.array([entry[3] for entry in entries], dtype=object)
+        self.departments = np.array([entry[4] for entry in entries], dtype=object)
+        self.municipality_keys = np.array([normalize_name(name) for name in self.municipalities], dtype=object)
+        self.department_keys = np.array([normalize_name(name) for name in self.departments], dtype=object)
+        self.points = to_unit_vectors(self.latitude, self.longitude).reshape(-1, 3)
+        self.tree = cKDTree(self.points) if cKDTree is not None and len(codes) else None
+        # Latitudes ordenadas para resolver los rectángulos con búsqueda binaria
+        self.latitude_order = np.argsort(self.latitude, kind='stable')
+        self.sorted_latitude = self.latitude[self.latitude_order]
+
+    # Las consultas devuelven posiciones en el índice y distancias en km
+
+    def nearest(self, latitude, longitude, k):
+        k = min(k, len(self.codes))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        point = to_unit_vectors(latitude, longitude)
+        if self.tree is not None:
+            chords, positions = self.tree.query(point, k=k)
+            return np.atleast_1d(positions), chord_to_km(np.atleast_1d(chords))
+        chords = np.linalg.norm(self.points - point, axis=1)
+        positions = np.argpartition(chords, k - 1)[:k]
+        positions = positions[np.argsort(chords[positions], kind='stable')]
+        return positions, chord_to_km(chords[positions])
+
+    def within_radius(self, latitude, longitude, radius_km):
+        point = to_unit_vectors(latitude, longitude)
+        chord = km_to_chord(radius_km)
+        if self.tree is not None:
+            positions = np.asarray(self.tree.query_ball_point(point, chord), dtype=np.int64)
+        else:
+            positions = np.flatnonzero(np.linalg.norm(self.points - point, axis=1) <= chord)
+        distances = chord_to_km(np.linalg.norm(self.points[positions] - point, axis=1))
+        order = np.argsort(distances, kind='stable')
+        return positions[order], distances[order]
+
+    def in_bbox(self, min_latitude, min_longitude, max_latitude, max_longitude):
+        lo = np.searchsorted(self.sorted_latitude, min_latitude, side='left')
+        hi = np.searchsorted(self.sorted_latitude, max_latitude, side='right')
+        candidates = self.latitude_order[lo:hi]
+        longitude = self.longitude[candidates]
+        return np.sort(candidates[(longitude >= min_longitude) & (longitude <= max_longitude)])
+
+    def locate(self, municipality=None, department=None):
+        municipality_key = normalize_name(municipality) if municipality else None
+        department_key = normalize_name(department) if department else None
+        in_department = np.ones(len(self.codes), dtype=bool)
+        if department_key:
+            in_department = self.department_keys == department_key
+        candidates = []
+        if municipality_key:
+            candidates.append(('municipality', (self.municipality_keys == municipality_key) & in_department))
+        if department_key:
+            candidates.append(('department', in_department))
+        for level, mask in candidates:
+            if mask.any():
+                # El promedio se toma sobre los vectores unitarios para que sea correcto en cualquier lugar
+                center = self.points[mask].mean(axis=0)
+                return (
+                    float(np.degrees(np.arctan2(center[2], np.hypot(center[0], center[1])))),
+                    float(np.degrees(np.arctan2(center[1], center[0]))),
+                    level,
+                )
+        return None
+
+
+class StationIndex:
+    """Índice espacial de las estaciones de viento.
+
+    Cada estación se ubica en la mediana de las coordenadas de sus
+    observaciones dentro del territorio colombiano; las estaciones sin
+    ninguna quedan fuera del índice. Las búsquedas se hacen sobre vectores unitarios en 3D, así
+    que las distancias son de gran círculo, con un k-d tree (cKDTree) si
+    scipy está instalado. Después de una mutación, la siguiente consulta
+    recalcula solo las estaciones que cambiaron y publica una versión nueva
+    del índice (ver `on_store_change`); las consultas en curso terminan con
+    la anterior.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        # Código de estación -> (latitud, longitud, nombre, municipio, departamento)
+        self._stations = {}
+        self._dirty = set(store.station_codes())
+        self._points = None
+
+    def on_store_change(self, store, change):
+        with self._lock:
+            self._dirty.update(change.keys['station_code'])
+
+    def _station_entry(self, code):
+        rows = self.store.station_rows(code)
+        if not len(rows):
+            return None
+        latitude = self.store.column('latitude', rows)
+        longitude = self.store.column('longitude', rows)
+        # Las coordenadas faltantes o ilegibles se guardan como 0.0 (ver
+        # DEFAULTS en datos_viento.py); solo cuentan las que caen en Colombia
+        valid = (
+            (latitude >= LATITUDE_RANGE[0]) & (latitude <= LATITUDE_RANGE[1])
+            & (longitude >= LONGITUDE_RANGE[0]) & (longitude <= LONGITUDE_RANGE[1])
+        )
+        if not valid.any():
+            return None
+        first = rows[:1]
+        return (
+            float(np.median(latitude[valid])),
+            float(np.median(longitude[valid])),
+            self.store.column('station_name', first)[0],
+            self.store.column('municipality', first)[0],
+            self.store.column('department', first)[0],
+        )
+
+    def _current(self):
+        points = self._points
+        if points is not None and not self._dirty:
+            return points
+        # El candado del almacén se toma antes que el propio, como en las
+        # notificaciones de cambios (ver `on_store_change`)
+        with self.store.reading(), self._lock:
+            if self._points is None or self._dirty:
+                with span('station_index_build'):
+                    for code in self._dirty:
+                        entry = self._station_entry(code)
+                        if entry is None:
+                            self._stations.pop(code, None)
+                        else:
+                            self._stations[code] = entry
+                    self._dirty = set()
+                    self._points = _StationPoints(self._stations)
+            return self._points
+
+    def __len__(self):
+        return len(self._current().codes)
+
+    def _results(self, points, positions, distances=None):
+        codes = points.codes[positions].tolist()
+        _, means = self.store.station_means(codes)
+        results = []
+        for i, position in enumerate(positions.tolist()):
+            result = {
+                'station_code': codes[i],
+                'station_name': points.names[position],
+                'municipality': points.municipalities[position],
+                'department': points.departments[position],
+                'latitude': float(points.latitude[position]),
+                'longitude': float(points.longitude[position]),
+                'mean_speed': None if np.isnan(means[i]) else float(means[i]),
+            }
+            if distances is not None:
+                result['distance_km'] = round(float(distances[i]), 3)
+            results.append(result)
+        return results
+
+    def nearest(self, latitude, longitude, k=5):
+        """Las `k` estaciones más cercanas al punto, de la más cercana a la más lejana."""
+        points = self._current()
+        return self._results(points, *points.nearest(latitude, longitude, k))
+
+    def within_radius(self, latitude, longitude, radius_km):
+        """Estaciones a menos de `radius_km` del punto, ordenadas por distancia."""
+        points = self._current()
+        return self._results(points, *points.within_radius(latitude, longitude, radius_km))
+
+    def in_bbox(self, min_latitude, min_longitude, max_latitude, max_longitude):
+        """Estaciones dentro del rectángulo, en el orden del índice."""
+        points = self._current()
+        return self._results(points, points.in_bbox(min_latitude, min_longitude, max_latitude, max_longitude))
+
+    def locate(self, municipality=None, department=None):
+        """Punto aproximado de un municipio o departamento a partir de sus estaciones.
+
+        Se usa el promedio de las estaciones del municipio (y departamento, si
+        se indica); si el municipio no tiene estaciones, el del departamento.
+        Devuelve (latitud, longitud) o None.
+        """
+        place = self.locate_place(municipality, department)
+        return None if place is None else place[:2]
+
+    def locate_place(self, municipality=None, department=None):
+        """Como `locate`, pero devuelve (latitud, longitud, nivel) o None.
+
+        El nivel es 'municipality' o 'department', según con qué estaciones
+        se ubicó el lugar; 'department' indica que el municipio no se encontró.
+        """
+        return self._current().locate(municipality, department)
+
+    def near_place(self, municipality=None, department=None, k=3):
+        """Estaciones más cercanas a un municipio o departamento, o [] si no se ubica."""
+        points = self._current()
+        point = points.locate(municipality, department)
+        if point is None:
+            return []
+        return self._results(points, *points.nearest(point[0], point[1], k))